@@ -1,17 +1,30 @@
 """ modified TextCtrl class.
 Provides spellcheck while type functionality"""
 
-__version__ = '02.02.2023'
+__version__ = '19.10.2026'
 __author__ = 'Serhiy Kobyakov'
 __license__ = "MIT"
 
 
-import enchant
+import os
+import re
+
 import wx
 import wx.lib.newevent
 
+from keyw_complete import get_completer
+from keyw_keywords import get_default_normalizer
+from keyw_perf import timed
+from keyw_spell import get_spellchecker
+
 DataReadyEvent, EVT_KEYW_DATA_READY = wx.lib.newevent.NewCommandEvent()
 
+# the words are separated by spaces, and by commas in title and description
+WORD_RE = re.compile(r"[^ ,]+")
+
+# wait for the pause in typing before making spelling suggestions, ms
+SUGGEST_DELAY = 700
+
 
 
 class MyTarget(wx.TextDropTarget):
@@ -41,7 +54,17 @@ class KeywTextCtrl(wx.TextCtrl):
         self.Bind(wx.EVT_TEXT, self.__do_spellcheck_while_type)
         self.Bind(wx.EVT_CHAR, self.__filter_keys_while_type)
 
-        self.the_dict = enchant.Dict("en_US")
+        # the dictionary is shared by all the text fields
+        self.the_dict = get_spellchecker()
+        # word start -> (word, is it correct) as it has been styled in the text
+        self.__styled_words = {}
+        # the text as it was before the last change: the styles from the change on are forgotten
+        self.__last_line = ''
+        # spelling suggestions made in the worker thread:
+        # the results which come with the old generation number are dropped
+        self.__suggest_timer = None
+        self.__suggest_future = None
+        self.__suggest_generation = 0
 
     def __filter_keys_while_type(self, event):
         # filter out characters which are not allowed in the keywords
@@ -60,8 +83,12 @@ class KeywTextCtrl(wx.TextCtrl):
         elif 312 <= key_code <= 317:
             # home and end; left, right, up and down arrows
             event.Skip()
+        elif key_code == 32 and event.ControlDown():
+            # Ctrl+Space: complete the word under the caret
+            self.show_completions()
         elif key_code == 13:
             # on Enter: format text line
+            self.__cancel_suggestions()
             self.format_text()
             self.spell_check()
             # send event: the keywords are ready to check
@@ -82,42 +109,136 @@ class KeywTextCtrl(wx.TextCtrl):
 
     def __do_spellcheck_while_type(self, event):
         """do spellcheck while type if necessary"""
-        if len(self.GetLineText(0)) == self.GetInsertionPoint() and self.need_spell_check_while_type:
-            last_word = self.GetLineText(0).split(' ')[-1]
+        the_line = self.GetLineText(0)
+        self.__forget_styles_from(len(os.path.commonprefix((self.__last_line, the_line))))
+        self.__last_line = the_line
+        if len(the_line) == self.GetInsertionPoint() and self.need_spell_check_while_type:
+            the_start = max(the_line.rfind(' '), the_line.rfind(',')) + 1
+            last_word = the_line[the_start:]
             if len(last_word) > 1:
-                the_end = len(self.GetLineText(0))
-                the_start = len(self.GetLineText(0)) - len(last_word)
-                if self.the_dict.check(last_word):
-                    self.SetStyle(the_start, the_start + 1, self.GetDefaultStyle())
-                    self.SetStyle(the_start, the_end, wx.TextAttr(wx.BLACK))
-                else:
-                    self.SetStyle(the_start, the_end, wx.TextAttr(wx.RED))
+                self.__style_word(the_start, last_word)
                 # print("spellcheck:", last_word, self.the_dict.check(last_word))
             self.need_spell_check_while_type = False
+            self.__schedule_suggestions()
+
+    def __cancel_suggestions(self):
+        """forget the suggestions which are being made"""
+        self.__suggest_generation += 1
+        if self.__suggest_future is not None:
+            self.__suggest_future.cancel()
+            self.__suggest_future = None
+        if self.__suggest_timer is not None:
+            self.__suggest_timer.Stop()
+
+    def __schedule_suggestions(self):
+        """make suggestions when the user stops typing"""
+        self.__cancel_suggestions()
+        if self.__suggest_timer is None:
+            self.__suggest_timer = wx.CallLater(SUGGEST_DELAY, self.__request_suggestions)
+        else:
+            self.__suggest_timer.Start(SUGGEST_DELAY)
+
+    def __word_at_caret(self):
+        """(start, word) under the caret or None"""
+        the_pos = self.GetInsertionPoint()
+        for match in WORD_RE.finditer(self.GetLineText(0)):
+            if match.start() <= the_pos <= match.end():
+                return match.start(), match.group()
+        return None
+
+    def __request_suggestions(self):
+        """ask the spellchecker for suggestions if the word under the caret is misspelled"""
+        the_word = self.__word_at_caret()
+        if the_word is None or len(the_word[1]) < 2 or self.the_dict.check(the_word[1]):
+            return
+        generation = self.__suggest_generation
+
+        def on_suggestions(suggestions):
+            # worker thread: pass the result to the GUI thread
+            wx.CallAfter(self.__show_suggestions, generation, the_word, suggestions)
+
+        self.__suggest_future = self.the_dict.suggest_async(the_word[1], on_suggestions)
+
+    def __show_suggestions(self, generation: int, the_word: tuple, suggestions: list):
+        """popup menu with suggestions, if the word is still the same"""
+        if not self or generation != self.__suggest_generation or len(suggestions) == 0:
+            return
+        if self.__word_at_caret() != the_word:
+            return
+        self.__popup_words(the_word, suggestions[:10])
+
+    def show_completions(self):
+        """popup menu with the most used keywords which start with the word under the caret"""
+        the_word = self.__word_at_caret()
+        if the_word is None:
+            return
+        completions = get_completer().complete(the_word[1])
+        if len(completions) > 0:
+            self.__cancel_suggestions()
+            self.__popup_words(the_word, completions)
+
+    def __popup_words(self, the_word: tuple, words: list):
+        """popup menu at the word, the chosen item replaces the word"""
+        the_start, word = the_word
+        menu = wx.Menu()
+        for menu_word in words:
+            item = menu.Append(wx.ID_ANY, menu_word)
+            menu.Bind(wx.EVT_MENU,
+                      lambda event, new_word=menu_word: self.__replace_word(the_start, word, new_word),
+                      item)
+        self.PopupMenu(menu, self.PositionToCoords(the_start + len(word)))
+        menu.Destroy()
+
+    def __replace_word(self, the_start: int, word: str, new_word: str):
+        """put the new word instead of the misspelled or incomplete one"""
+        if self.GetLineText(0)[the_start:the_start + len(word)] == word:
+            self.Replace(the_start, the_start + len(word), new_word)
+            self.SetInsertionPoint(the_start + len(new_word))
+            self.spell_check()
+
+    def __style_word(self, the_start: int, word: str):
+        """show the word in red if it is misspelled, touch the text only if the word style changes"""
+        correct = self.the_dict.check(word)
+        if self.__styled_words.get(the_start) != (word, correct):
+            self.SetStyle(the_start, the_start + len(word), wx.TextAttr(wx.BLACK if correct else wx.RED))
+            self.__styled_words[the_start] = (word, correct)
+
+    def __forget_styles_from(self, the_pos: int):
+        """the text from the_pos on is changed: the new text there has the style of the text before it,
+        not the one it had, so the words which end at the_pos or after it have to be styled again"""
+        self.__styled_words = {the_start: styled for the_start, styled in self.__styled_words.items()
+                               if the_start + len(styled[0]) < the_pos}
+
+    def Clear(self):
+        """clear the text and forget the styled words"""
+        self.__styled_words = {}
+        self.__cancel_suggestions()
+        wx.TextCtrl.Clear(self)
 
     def format_text(self):
         """remove unnecessary spaces and then remove duplicates"""
-        if len(self.GetLineText(0)) > 0:
-            the_line = self.GetLineText(0).replace('  ', ' ').replace('  ', ' ').strip()
-            keywords = list(dict.fromkeys(the_line.split(' ')))
-            new_line = ' '.join(keywords)
-            if len(the_line) != len(new_line):
+        the_line = self.GetLineText(0)
+        if len(the_line) > 0:
+            new_line = get_default_normalizer().normalize_line(the_line)
+            if the_line != new_line:
                 self.Clear()
                 self.AppendText(new_line)
 
+    @timed('spellcheck')
     def spell_check(self):
-        """show misspelled words in red"""
-        if len(self.GetLineText(0)) > 0:
-            the_line = self.GetLineText(0)
-            words = the_line.split(' ')
-            for word in words:
-                the_start = the_line.find(word)
-                the_end = the_start + len(word)
-                if self.the_dict.check(word):
-                    self.SetStyle(the_start, the_start + 1, self.GetDefaultStyle())
-                    self.SetStyle(the_start, the_end, wx.TextAttr(wx.BLACK))
-                else:
-                    self.SetStyle(the_start, the_end, wx.TextAttr(wx.RED))
+        """show misspelled words in red
+
+        The word positions are found in one pass over the line,
+        and only the words which are new or moved since the last check get restyled."""
+        the_line = self.GetLineText(0)
+        if len(the_line) > 0:
+            old_styled_words = self.__styled_words
+            self.__styled_words = {}
+            for match in WORD_RE.finditer(the_line):
+                the_start = match.start()
+                if the_start in old_styled_words:
+                    self.__styled_words[the_start] = old_styled_words[the_start]
+                self.__style_word(the_start, match.group())
 
     def append_words(self, the_line: str):
         """append new line with keywords into the text field"""
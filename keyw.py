@@ -1,26 +1,44 @@
 """keyw application frame module"""
 
-__version__ = '02.02.2023'
+__version__ = '19.10.2026'
 __author__ = 'Serhiy Kobyakov'
 __license__ = "MIT"
 
 
 import configparser
-import glob
 import io
 import os
+import threading
 
 import wx
 
 from KeywTextCtrl import EVT_KEYW_DATA_READY
 from KeywTextCtrl import KeywTextCtrl
-from keyw_db import KeywDB
+from keyw_atlas import TILE_FILL
+from keyw_atlas import TILE_SIZE
+from keyw_complete import PrefixIndex
+from keyw_complete import set_completer
+from keyw_core import THUMBNAIL_SIZE
+from keyw_core import KeywCore
+from keyw_db import KEYWORD_COLUMNS
+from keyw_perf import latency
+from keyw_perf import startup
+from keyw_perf import timed
+from keyw_preview import PreviewPyramid
+from keyw_preview import pillow_decode
+from keyw_similar import HASH_HEIGHT
+from keyw_similar import HASH_WIDTH
+from keyw_spell import get_spellchecker
 
 
 APP_DIR = ""
 WORKING_DIR = ""
 RELEASE_DIR = "~/"
 SCALE_FACTOR = 1.
+SPELL_MIN_COUNT = 3
+# wait for the pause in typing before searching DB, ms
+SEARCH_DELAY = 300
+STARTUP_TARGET_MS = 1500.
 BORDER_IN = 3
 BORDER_TOP = 3
 TEXT_HEIGHT = 1
@@ -61,8 +79,8 @@ KEYW_FRAME = 100
 # dispatcher object
 kd = None
 
-# database object
-keyw_db = None
+# the core object: files, DB, releases and keywords
+core = None
 
 
 class BrowsePanel(wx.Panel):
@@ -72,10 +90,13 @@ class BrowsePanel(wx.Panel):
         dir_ctrl = wx.DirPickerCtrl(self, DIR_BROWSER, style=wx.DIRCTRL_DEFAULT_STYLE)
         dir_ctrl.SetPath(WORKING_DIR)
         dir_ctrl.Bind(wx.EVT_DIRPICKER_CHANGED, self.do_list_files)
-        self.files_list = wx.ListBox(self, FILES_LIST, style=wx.LB_SINGLE ^ wx.LB_HSCROLL)
+        # many images of the series may be selected to save the same data for them
+        self.files_list = wx.ListBox(self, FILES_LIST, style=wx.LB_EXTENDED ^ wx.LB_HSCROLL)
         self.do_list_files(None)
         self.files_list.SetMinSize((FNAME_STR_LENGTH, -1))
         self.files_list.Bind(wx.EVT_LISTBOX, self.do_show_new_image)
+        # re-read the working directory when the user comes back to the app
+        wx.GetTopLevelParent(self).Bind(wx.EVT_ACTIVATE, self.do_refresh_files)
 
         # Directory and file choose, leftmost vertical sizer
         file_sizer = wx.BoxSizer(wx.VERTICAL)
@@ -88,13 +109,29 @@ class BrowsePanel(wx.Panel):
     def do_list_files(self, event):
         """ updates list of jpegs in files list using actual working directory"""
         the_dir_picker = wx.FindWindowById(DIR_BROWSER)
+        global WORKING_DIR
         WORKING_DIR = the_dir_picker.GetPath()
         # print("Change working dir to:", WORKING_DIR)
-        the_files = [os.path.basename(x) for x in glob.glob(os.path.join(WORKING_DIR, '*.jpg'))]
+        core.set_working_dir(WORKING_DIR)
+        self.__fill_files_list()
+
+    def do_refresh_files(self, event):
+        """update the files list if the working directory has been changed"""
+        event.Skip()
+        if event.GetActive() and core.files.refresh():
+            self.__fill_files_list()
+
+    def __fill_files_list(self):
+        """put the files from the index into the files list, keep the selection"""
         the_listbox = wx.FindWindowById(FILES_LIST)
+        selected = [the_listbox.GetString(i) for i in the_listbox.GetSelections()]
         the_listbox.Clear()
-        if len(the_files) > 0:
-            the_listbox.InsertItems(the_files, 0)
+        if len(core.files) > 0:
+            the_listbox.InsertItems(core.file_names(), 0)
+            for the_name in selected:
+                i = the_listbox.FindString(the_name, caseSensitive=True)
+                if i != wx.NOT_FOUND:
+                    the_listbox.SetSelection(i)
 
     def do_show_new_image(self, event):
         """show new image"""
@@ -293,7 +330,7 @@ class MetadataPanel(wx.Panel):
 
     def do_save_metadata_open_next(self, event):
         the_listbox = wx.FindWindowById(FILES_LIST)
-        if the_listbox.GetSelection() > -1:
+        if len(the_listbox.GetSelections()) > 0:
             kd.save_data()
 
 
@@ -307,14 +344,22 @@ class DatabasePanel(wx.Panel):
         db_search_edit = wx.TextCtrl(self, DB_SEARCH_EDIT, style=wx.TE_PROCESS_ENTER | wx.TE_MULTILINE)
         db_search_edit.SetMinSize((FNAME_STR_LENGTH * 4, TEXT_HEIGHT))
         db_search_edit.Bind(wx.EVT_TEXT_ENTER, self.search_DB_for_keywords)
+        db_search_edit.Bind(wx.EVT_TEXT, self.on_search_text)
         # thumbnails_ctrl = wx.ListCtrl(self, DB_SEARCH_RESULTS, style=wx.LC_ICON)
         thumbnails_ctrl = wx.ListCtrl(self, DB_SEARCH_RESULTS, style=wx.LC_ICON | wx.LC_AUTOARRANGE)
+        similar_button = wx.Button(self, id=wx.ID_ANY, label="Find visually similar")
+        similar_button.Bind(wx.EVT_BUTTON, self.on_similar_button)
         the_button = wx.Button(self, id=wx.ID_ANY, label="Populate the metadata fields")
         the_button.Bind(wx.EVT_BUTTON, self.on_button)
 
+        buttons_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        buttons_sizer.Add(similar_button, 0, wx.ALL, BORDER_IN)
+        buttons_sizer.AddStretchSpacer()
+        buttons_sizer.Add(the_button, 0, wx.ALL, BORDER_IN)
+
         the_sizer.Add(db_search_edit, 0, wx.ALL | wx.EXPAND, BORDER_IN)
         the_sizer.Add(thumbnails_ctrl, 1, wx.EXPAND, BORDER_IN)
-        the_sizer.Add(the_button, 0, wx.ALL | wx.ALIGN_RIGHT, BORDER_IN)
+        the_sizer.Add(buttons_sizer, 0, wx.EXPAND)
 
         the_sizer.Layout()
         self.SetSizerAndFit(the_sizer)
@@ -324,9 +369,35 @@ class DatabasePanel(wx.Panel):
     def search_DB_for_keywords(self, event):
         kd.search_for_images_in_DB()
 
+    def on_search_text(self, event):
+        event.Skip()
+        kd.schedule_search()
+
     def on_button(self, event):
         kd.populate_text_fields_using_search_results()
 
+    def on_similar_button(self, event):
+        kd.find_similar_images()
+
+
+class LazyPage(wx.Panel):
+    """notebook page which makes its content when it is shown for the first time"""
+    def __init__(self, parent, page_class):
+        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
+        self.page_class = page_class
+        self.content = None
+
+    def build(self) -> bool:
+        """make the page content, return True if it has been made just now"""
+        if self.content is not None:
+            return False
+        self.content = self.page_class(self)
+        the_sizer = wx.BoxSizer(wx.VERTICAL)
+        the_sizer.Add(self.content, 1, wx.EXPAND)
+        self.SetSizer(the_sizer)
+        self.Layout()
+        return True
+
 
 class KeywFrame(wx.Frame):
     def __init__(self, parent):
@@ -348,12 +419,22 @@ class KeywFrame(wx.Frame):
         BORDER_IN = self.config.getint('keyw', 'BORDER_IN', fallback=1)
         global BORDER_TOP
         BORDER_TOP = self.config.getint('keyw', 'BORDER_TOP', fallback=1)
+        global SPELL_MIN_COUNT
+        SPELL_MIN_COUNT = self.config.getint('keyw', 'SPELL_MIN_COUNT', fallback=3)
+        user_dict = self.config.get('keyw', 'USER_DICT', fallback='')
+        global STARTUP_TARGET_MS
+        STARTUP_TARGET_MS = self.config.getfloat('keyw', 'STARTUP_TARGET_MS', fallback=1500.)
+        startup.mark('read keyw.ini')
         # check if we get the variables successfully:
         # print('DEFAULT_DIR:', DEFAULT_DIR)
 
-        # create DB object
-        global keyw_db
-        keyw_db = KeywDB(RELEASE_DIR)
+        # create core object: DB, files index, releases index and keywords vocabulary
+        global core
+        core = KeywCore(self.config, check_db=False)
+        startup.mark('core objects')
+
+        if len(user_dict) > 0:
+            get_spellchecker().set_personal_word_list(user_dict)
 
         global KEYW_FRAME
         super().__init__(parent, title="Image keywords editor v." + __version__, id=KEYW_FRAME,
@@ -380,9 +461,11 @@ class KeywFrame(wx.Frame):
 
         notebook = wx.Notebook(the_panel, id=MAIN_NOTEBOOK)
         tab1 = MetadataPanel(notebook)
-        tab2 = DatabasePanel(notebook)
+        # database search page is made when the user opens it
+        tab2 = LazyPage(notebook, DatabasePanel)
         notebook.AddPage(tab1, "Metadata")
         notebook.AddPage(tab2, "Database search")
+        notebook.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self.on_page_changed)
 
         sizer = wx.BoxSizer()
         sizer.Add(notebook, 1)
@@ -396,13 +479,51 @@ class KeywFrame(wx.Frame):
         the_img_preview = wx.FindWindowById(IMAGE_PREVIEW)
         the_img_preview.SetMinSize(the_img_preview.GetSize())
 
+        startup.mark('widgets')
+
         # create dispatcher object
         global kd
         kd = KeywDispatcher()
 
+        # everything which is not needed to show the window is done after that
+        wx.CallAfter(self.__after_first_paint)
+
+    def __after_first_paint(self):
+        """check DB, load the dictionary and the keywords vocabulary"""
+        startup.mark('first paint')
+        core.db.check_db()
+        get_spellchecker().preload_in_background()
+        core.vocabulary.load_in_background(core.db, self.__on_vocabulary_loaded)
+        startup.mark('DB check, background loading started')
+        startup.report(STARTUP_TARGET_MS)
+
+    def on_page_changed(self, event):
+        """make the lazy page when it is shown for the first time"""
+        event.Skip()
+        the_page = event.GetEventObject().GetPage(event.GetSelection())
+        if isinstance(the_page, LazyPage) and the_page.build():
+            kd.attach_search_page()
+
+    def __on_vocabulary_loaded(self):
+        """worker thread: prepare spellcheck and autocomplete data from the vocabulary"""
+        # the keywords used in DB at least SPELL_MIN_COUNT times are treated as correct
+        user_words = core.vocabulary.words(SPELL_MIN_COUNT)
+        # the keywords autocomplete ranked by usage
+        completer = PrefixIndex(core.vocabulary.counts())
+        footprint = core.vocabulary.memory_footprint()
+        wx.CallAfter(self.__use_vocabulary, user_words, completer, footprint)
+
+    def __use_vocabulary(self, user_words: list, completer: PrefixIndex, footprint: int):
+        """use the keywords vocabulary in spellcheck and autocomplete"""
+        get_spellchecker().add_user_words(user_words)
+        set_completer(completer)
+        core.vocabulary.add_listener(lambda removed, added: (completer.remove(removed), completer.update(added)))
+        self.status_bar.SetStatusText(f"vocabulary: {len(core.vocabulary)} keywords, {footprint / 1048576:.1f} MB")
+        print(f"keyw vocabulary: {len(core.vocabulary)} keywords, {footprint / 1048576:.1f} MB")
+
 
 class KeywDispatcher:
-    """dispatcher for keyw app"""
+    """dispatcher for keyw app: moves the data between the widgets and the core object"""
     # the_frame = None
     # files_list = None
     # img_preview = None
@@ -435,6 +556,8 @@ class KeywDispatcher:
             print("Error: keyw app window wasn't initialized properly!")
             exit(1)
         self.files_list = wx.FindWindowById(FILES_LIST)
+        # the image shown in the preview, its data is in the fields
+        self.shown_file = ''
         self.img_preview = wx.FindWindowById(IMAGE_PREVIEW)
         self.isolation_listbox = wx.FindWindowById(ISOLATION_LISTBOX)
         self.isolation = wx.FindWindowById(ISOLATION_EDIT)
@@ -453,66 +576,134 @@ class KeywDispatcher:
         self.composition = wx.FindWindowById(COMPOSITION_EDIT)
         self.wwwww = wx.FindWindowById(WWWWW_EDIT)
         self.the_rest = wx.FindWindowById(THE_REST_EDIT)
-        self.search_DB = wx.FindWindowById(DB_SEARCH_EDIT)
-        self.search_results = wx.FindWindowById(DB_SEARCH_RESULTS)
-        self.image_list = wx.ImageList(256, 256, mask=True)
-        self.search_results.AssignImageList(self.image_list, wx.IMAGE_LIST_NORMAL)
+        # database search page widgets, see attach_search_page()
+        self.search_DB = None
+        self.search_results = None
+        self.image_list = None
+        # search as you type: the search starts when the user stops typing,
+        # the results which come with the old generation number are dropped
+        self.__search_timer = None
+        self.__search_generation = 0
         self.main_notebook = wx.FindWindowById(MAIN_NOTEBOOK)
         self.status_label = wx.FindWindowById(STATUS_LABEL)
 
         self.keyw_edits = [self.concept, self.news, self.actions, self.emotions, self.model_spec, self.objects,
                            self.image_spec, self.location, self.composition, self.wwwww, self.the_rest]
 
+        # the previews of the last images at several resolutions,
+        # the thumbnails for DB are made from them too
+        self.previews = PreviewPyramid(self.__decode_preview, self.__downscale_preview, self.__preview_size,
+                                       n_files=self.the_frame.config.getint('keyw', 'PREVIEW_CACHE_FILES',
+                                                                            fallback=4))
+        # the preview size the shown bitmap was made for
+        self.__preview_shown_size = None
+        self.img_preview.Bind(wx.EVT_SIZE, self.__on_preview_resize)
+
+        # the thumbnails for DB and their perceptual hashes are made by wx
+        core.thumbnailer = self.__jpg_data_from_file
+        core.similar.gray = self.__gray_from_jpg_data
+
+    def attach_search_page(self):
+        """find the database search page widgets when the page is made"""
+        self.search_DB = wx.FindWindowById(DB_SEARCH_EDIT)
+        self.search_results = wx.FindWindowById(DB_SEARCH_RESULTS)
+        self.image_list = wx.ImageList(256, 256, mask=True)
+        self.search_results.AssignImageList(self.image_list, wx.IMAGE_LIST_NORMAL)
 
-    def __image_from_file(self, fname: str) -> wx.Image:
-        """returns resized wx.Image from jpg file"""
+
+    @staticmethod
+    def __decode_preview(fname: str, max_side: int) -> wx.Image:
+        """returns wx.Image from jpg file, reduced by the jpeg decoder if Pillow is there"""
+        rgb = pillow_decode(fname, max_side)
+        if rgb is not None:
+            the_w, the_h, the_data = rgb
+            return wx.Image(the_w, the_h, the_data)
         data = open(fname, "rb").read()
-        the_image = wx.Image(io.BytesIO(data))
+        return wx.Image(io.BytesIO(data))
+
+    @staticmethod
+    def __downscale_preview(the_image: wx.Image, max_side: int) -> wx.Image:
+        """returns wx.Image resized to fit into max_side square"""
         the_w = the_image.GetWidth()
         the_h = the_image.GetHeight()
-        # print(f"size: {the_w}x{the_h}")
         if the_w > the_h:
-            w = 256
-            h = round(256 * the_h / the_w)
+            w = max_side
+            h = max(1, round(max_side * the_h / the_w))
         else:
-            h = 256
-            w = round(256 * the_w / the_h)
-        return the_image.Scale(w, h)
+            h = max_side
+            w = max(1, round(max_side * the_w / the_h))
+        return the_image.Scale(w, h, wx.IMAGE_QUALITY_HIGH)
+
+    @staticmethod
+    def __preview_size(the_image: wx.Image) -> tuple:
+        return the_image.GetWidth(), the_image.GetHeight()
 
     def __jpg_data_from_file(self, f_name: str) -> bytes:
         """returns cropped jpg image as a binary data from jpg file"""
-        the_img = self.__image_from_file(f_name)
-        the_img.SetOption('quality', 50)
-        the_img.SaveFile("/tmp/tmp.jpg", wx.BITMAP_TYPE_JPEG)
-        the_data = open("/tmp/tmp.jpg", "rb").read()
-        os.remove("/tmp/tmp.jpg")
+        the_img = self.previews.get(f_name, THUMBNAIL_SIZE)
+        with latency.measure('thumbnail encode'):
+            the_img.SetOption('quality', 50)
+            # in memory: the thumbnails of the batch are made in parallel
+            the_stream = io.BytesIO()
+            the_img.SaveFile(the_stream, wx.BITMAP_TYPE_JPEG)
+            the_data = the_stream.getvalue()
         return the_data
 
 
+    @staticmethod
+    def __gray_from_jpg_data(jpg_data: bytes) -> bytes:
+        """returns the gray pixels of the jpg image reduced for the perceptual hash"""
+        the_image = wx.Image(io.BytesIO(jpg_data), type=wx.BITMAP_TYPE_JPEG)
+        the_image = the_image.ConvertToGreyscale().Scale(HASH_WIDTH, HASH_HEIGHT, wx.IMAGE_QUALITY_BILINEAR)
+        # r, g and b are the same
+        return bytes(the_image.GetData())[::3]
+
+    def selected_files(self) -> list:
+        """the files selected in the files list"""
+        return [self.files_list.GetString(i) for i in self.files_list.GetSelections()]
+
+    def __show_preview(self, the_file: str):
+        """show the image in the preview, made from the pyramid level which fits the preview size"""
+        the_w, the_h = self.img_preview.GetClientSize()
+        if the_w <= 0 or the_h <= 0:
+            return
+        self.__preview_shown_size = (the_w, the_h)
+        self.img_preview.SetBitmap(wx.Bitmap(self.previews.fit(the_file, the_w, the_h)))
+
+    def __on_preview_resize(self, event):
+        """the new preview is made from the cached level, the file is not read again"""
+        event.Skip()
+        if len(self.shown_file) > 0 and self.img_preview.GetClientSize() != self.__preview_shown_size:
+            self.__show_preview(core.files.path(self.shown_file))
+
+    @timed('show image')
     def show_image(self):
         """show new image"""
-        if self.files_list.GetSelection() != -1:
+        selected = self.selected_files()
+        if len(selected) > 1 and self.shown_file in selected:
+            # the images are added to the batch, the data of the shown one stays in the fields
+            self.the_frame.status_bar.SetStatusText(f"{len(selected)} images selected, "
+                                                    f"the data will be saved for all of them")
+            return
+        if len(selected) > 0:
             self.__clear_all_fields()
-            fname = self.files_list.GetString(self.files_list.GetSelection())
-            the_file = os.path.join(WORKING_DIR, fname)
+            rel_name = selected[0]
+            self.shown_file = rel_name
+            the_file = core.files.path(rel_name)
 
-            the_bitmap = wx.Bitmap(self.__image_from_file(the_file))
-            the_img_preview = wx.FindWindowById(IMAGE_PREVIEW)
-            the_img_preview.SetBitmap(the_bitmap)
+            self.__show_preview(the_file)
 
             # load models and property releases for this day
-            the_day = fname.split('_')[0]
-            # print("models for the_day:", self.__get_models_list(the_day))
-            models_for_the_day = self.__get_models_list(the_day)
+            models_for_the_day, prop_for_the_day = core.releases_for(rel_name)
+            # print("models for the_day:", models_for_the_day)
             if len(models_for_the_day) > 0:
                 self.model_listbox.InsertItems(models_for_the_day, 0)
-            prop_for_the_day = self.__get_property_list(the_day)
             if len(prop_for_the_day) > 0:
                 self.property_listbox.InsertItems(prop_for_the_day, 0)
 
             # if there is image data in DB - load it
             # else if there is metadata in the image - load it
-            if not self.__get_image_data_from_DB(fname):
+            if not self.__get_image_data_from_DB(rel_name):
                 self.__get_metadata_from_image()
             self.update_status()
 
@@ -533,27 +724,15 @@ class KeywDispatcher:
 
 
     def __rm_keywords_duplicates(self):
-        """remove duplicates in keywords fields"""
-        # make a list of lists of words from the list of strings:
-        outp_list = [widget.list_of_words() for widget in self.keyw_edits]
-        # make a list of all words:
-        allwords = [w for lst in outp_list for w in lst]
-
-        if len(allwords) != len(set(allwords)):
-            # if we have duplicates:
-            for i in range(len(outp_list)):
-                if i < 10 and len(outp_list[i]) > 0:
-                    for keyw in outp_list[i]:
-                        for other_index in range(i + 1, len(outp_list)):
-                            if keyw in outp_list[other_index]:
-                                outp_list[other_index].remove(keyw)
-
-            # update keywords fields if necessary:
-            for i in range(len(outp_list)):
-                the_str = ' '.join(outp_list[i])
-                if len(self.keyw_edits[i].GetLineText(0)) != len(the_str):
-                    self.keyw_edits[i].Clear()
-                    self.keyw_edits[i].AppendText(the_str)
+        """remove duplicates in keywords fields, the word stays in the upper field"""
+        old_lines = [widget.GetLineText(0) for widget in self.keyw_edits]
+        new_lines = core.normalizer.dedup_fields(old_lines)
+
+        # update keywords fields if necessary:
+        for widget, old_line, new_line in zip(self.keyw_edits, old_lines, new_lines):
+            if old_line != new_line:
+                widget.Clear()
+                widget.AppendText(new_line)
 
 
     def __spellcheck_keywords(self):
@@ -573,57 +752,62 @@ class KeywDispatcher:
 
         # status_str = self.files_list.GetString(self.files_list.GetSelection())
         # self.the_frame.StatusBar.SetStatusText(status_str)
+        if latency.enabled:
+            # p50/p95 of the slowest operations
+            self.the_frame.status_bar.SetStatusText(latency.status_text())
 
+    @timed('save')
     def save_data(self):
-        """when we are happy with the data - write it to DB and update the image"""
+        """when we are happy with the data - write it to DB and update the images"""
         # check if everything is allright within the data gathered in the text fields
 
         # write the data and select new image
-        self.__write_to_db()
-        self.__write_metadata_to_image()
+        selected = self.selected_files()
+        if not self.__write_to_db(selected):
+            # the operator's data stays in the fields
+            return
+        self.__write_metadata_to_images(selected)
         self.__select_next_image()
 
-    def __get_image_data_from_DB(self, the_image: str) -> bool:
-        img_data = keyw_db.get_img_metadata(the_image)
-        if img_data is not None:
+    def __get_image_data_from_DB(self, rel_name: str) -> bool:
+        record = core.load_record(rel_name)
+        if record is not None:
             # isolation
-            if len(img_data[1]) == 0:
+            if len(record['isolation']) == 0:
                 self.isolation_listbox.SetSelection(0)
             else:
-                self.isolation.AppendText(img_data[1])
-                if img_data[1] == 'white':
+                self.isolation.AppendText(record['isolation'])
+                if record['isolation'] == 'white':
                     self.isolation_listbox.SetSelection(1)
-                elif img_data[1] == 'black':
+                elif record['isolation'] == 'black':
                     self.isolation_listbox.SetSelection(2)
                 else:
                     self.isolation_listbox.SetSelection(3)
             # model
-            if len(img_data[2]) == 0:
+            if len(record['models']) == 0:
                 self.model_listbox.SetSelection(-1)
             else:
-                models = img_data[2].split(', ')
+                models = record['models'].split(', ')
                 for model in models:
                     self.model_listbox.SetSelection(self.model_listbox.FindString(model))
             # property
-            if len(img_data[3]) == 0:
+            if len(record['property']) == 0:
                 self.property_listbox.SetSelection(-1)
             else:
-                models = img_data[3].split(', ')
+                models = record['property'].split(', ')
                 for model in models:
                     self.property_listbox.SetSelection(self.property_listbox.FindString(model))
             # text fields
-            if len(img_data[4]) > 0:
+            if len(record['title']) > 0:
                 self.title.Clear()
-                self.title.AppendText(img_data[4])
-            if len(img_data[5]) > 0:
+                self.title.AppendText(record['title'])
+            if len(record['description']) > 0:
                 self.descr.Clear()
-                self.descr.AppendText(img_data[5])
+                self.descr.AppendText(record['description'])
 
-            i = 6
-            for widget in self.keyw_edits:
-                if len(img_data[i]) > 0:
-                    widget.append_words(img_data[i])
-                i += 1
+            for widget, column in zip(self.keyw_edits, KEYWORD_COLUMNS):
+                if len(record[column]) > 0:
+                    widget.append_words(record[column])
 
             return True
         else:
@@ -633,49 +817,17 @@ class KeywDispatcher:
     def __get_metadata_from_image(self):
         pass
 
-    def __get_models_list(self, the_day: str):
-        all_mr_jpg = glob.glob(os.path.join(RELEASE_DIR, 'Models', '*.jpg'))
-        all_models_jpg = [os.path.basename(x).split('.')[0][11:] for x in all_mr_jpg if x.find(the_day) > 0]
-        all_mr_pdf = glob.glob(os.path.join(RELEASE_DIR, 'Models', '*.pdf'))
-        all_models = [os.path.basename(x).split('.')[0][11:] for x in all_mr_pdf if x.find(the_day) > 0]
-        if len(all_models) > 0 and len(all_models_jpg) > 0:
-            models = list(dict.fromkeys(all_models.extend(all_models_jpg)))
-        elif len(all_models) == 0 and len(all_models_jpg) > 0:
-            models = all_models_jpg
-        elif len(all_models) > 0 and len(all_models_jpg) == 0:
-            models = all_models
-        else:
-            models = []
-        if len(models) > 0:
-            models = [model.replace('_', ' ') for model in models]
-        return models
-
-    def __get_property_list(self, the_day: str):
-        all_mr_jpg = glob.glob(os.path.join(RELEASE_DIR, 'Properties', '*.jpg'))
-        all_owners_jpg = [os.path.basename(x).split('.')[0][11:] for x in all_mr_jpg if x.find(the_day) > 0]
-        all_mr_pdf = glob.glob(os.path.join(RELEASE_DIR, 'Properties', '*.pdf'))
-        all_owners = [os.path.basename(x).split('.')[0][11:] for x in all_mr_pdf if x.find(the_day) > 0]
-        if len(all_owners) > 0 and len(all_owners_jpg) > 0:
-            owners = list(dict.fromkeys(all_owners.extend(all_owners_jpg)))
-        elif len(all_owners) == 0 and len(all_owners_jpg) > 0:
-            owners = all_owners_jpg
-        elif len(all_owners) > 0 and len(all_owners_jpg) == 0:
-            owners = all_owners
-        else:
-            owners = []
-        if len(owners) > 0:
-            owners = [owner.replace('_', ' ') for owner in owners]
-        return owners
-
-
     def __select_next_image(self):
-        """ select next image"""
-        if self.files_list.GetSelection() == self.files_list.GetCount() - 1:
+        """ select the image next to the selected ones"""
+        selections = self.files_list.GetSelections()
+        if max(selections) == self.files_list.GetCount() - 1:
             print("Done working!")
             exit(0)
         else:
             # select new element
-            self.files_list.SetSelection(self.files_list.GetSelection() + 1)
+            for i in selections:
+                self.files_list.Deselect(i)
+            self.files_list.SetSelection(max(selections) + 1)
             # post event so listbox'es internal function can take care of showing new image
             wx.PostEvent(self.files_list.GetEventHandler(), wx.PyCommandEvent(wx.EVT_LISTBOX.typeId, FILES_LIST))
 
@@ -699,35 +851,52 @@ class KeywDispatcher:
         self.composition.Clear()
         self.wwwww.Clear()
         self.the_rest.Clear()
-        self.search_DB.Clear()
-        self.search_results.ClearAll()
+        if self.search_DB is not None:
+            self.search_DB.Clear()
+            self.search_results.ClearAll()
 
-    def __write_metadata_to_image(self):
+    def __write_metadata_to_images(self, rel_names: list):
         pass
 
-    def __write_to_db(self):
-        """insert actual data to database"""
-        if self.files_list.GetSelection() > -1:
-            fname = self.files_list.GetString(self.files_list.GetSelection())
-            the_file = os.path.join(WORKING_DIR, fname)
-            keyw_db.insert_image_data(self.__jpg_data_from_file(the_file),
-                                      self.files_list.GetString(self.files_list.GetSelection()),
-                                      self.isolation.GetLineText(0),
-                                      self.__get_models_str(),
-                                      self.__get_property_str(),
-                                      self.title.GetLineText(0),
-                                      self.descr.GetLineText(0),
-                                      self.concept.GetLineText(0),
-                                      self.news.GetLineText(0),
-                                      self.actions.GetLineText(0),
-                                      self.emotions.GetLineText(0),
-                                      self.model_spec.GetLineText(0),
-                                      self.objects.GetLineText(0),
-                                      self.image_spec.GetLineText(0),
-                                      self.location.GetLineText(0),
-                                      self.composition.GetLineText(0),
-                                      self.wwwww.GetLineText(0),
-                                      self.the_rest.GetLineText(0))
+    def __write_to_db(self, rel_names: list) -> bool:
+        """insert actual data to database, return True if the data of all the images is written"""
+        replace = False
+        others = core.other_images(rel_names)
+        if len(others) > 0:
+            # the same image with the pixels edited, or the other one with the same name
+            answer = wx.MessageBox("DB has the data of the image with the same name but other content:\n"
+                                   f"{', '.join(others)}\n\n"
+                                   "Replace it, if it is the same image edited?",
+                                   "keyw", wx.YES_NO | wx.NO_DEFAULT | wx.ICON_QUESTION, self.the_frame)
+            if answer != wx.YES:
+                self.the_frame.status_bar.SetStatusText("the data is not saved")
+                return False
+            replace = True
+        n_written = len(rel_names)
+        if len(rel_names) == 1:
+            n_written = core.save_record(rel_names[0], self.__record_from_fields(), replace)
+        elif len(rel_names) > 1:
+            # one transaction for the whole batch
+            n_written = core.save_records(core.batch_records(rel_names, self.__record_from_fields(),
+                                                             self.shown_file), replace)
+        if n_written < len(rel_names):
+            wx.MessageBox(f"The data of {len(rel_names) - n_written} of {len(rel_names)} images is not saved,\n"
+                          "please see the terminal output for the error.",
+                          "keyw", wx.OK | wx.ICON_ERROR, self.the_frame)
+            return False
+        return True
+
+    def __record_from_fields(self) -> dict:
+        """image data from the widgets"""
+        record = core.empty_record()
+        record['isolation'] = self.isolation.GetLineText(0)
+        record['models'] = self.__get_models_str()
+        record['property'] = self.__get_property_str()
+        record['title'] = self.title.GetLineText(0)
+        record['description'] = self.descr.GetLineText(0)
+        for widget, column in zip(self.keyw_edits, KEYWORD_COLUMNS):
+            record[column] = widget.GetLineText(0)
+        return record
 
     def __get_models_str(self):
         """get models list as a string"""
@@ -737,29 +906,104 @@ class KeywDispatcher:
         """get property owner(s) list as a string"""
         return ', '.join([self.property_listbox.GetString(x) for x in self.property_listbox.GetSelections()])
 
+    def schedule_search(self):
+        """search DB when the user stops typing"""
+        if self.__search_timer is None:
+            self.__search_timer = wx.CallLater(SEARCH_DELAY, self.search_for_images_in_DB)
+        else:
+            self.__search_timer.Start(SEARCH_DELAY)
+
     def search_for_images_in_DB(self):
-        """search for images in database and show result"""
+        """search for images in database in the worker thread and show result"""
+        if self.__search_timer is not None:
+            self.__search_timer.Stop()
+        self.__search_generation += 1
+        generation = self.__search_generation
+        search_str = self.search_DB.GetLineText(0)
+        if len(search_str.strip()) == 0:
+            core.cancel_search()
+            self.search_results.ClearAll()
+            self.image_list.RemoveAll()
+            return
+        # print(" search for images in DB with string:", search_str)
+
+        def on_results(results):
+            # worker thread: pass the result to the GUI thread
+            wx.CallAfter(self.__search_results_found, generation, results)
+
+        core.search_async(search_str, on_results)
+
+    def __search_results_found(self, generation: int, results: list):
+        """show the results of the latest search only"""
+        if generation != self.__search_generation:
+            return
+        # print(f"got {len(results)} results")
+        self.__show_search_results(results)
+
+    def __show_search_results(self, file_names: list):
+        """show the images in the search results, the thumbnails are read from DB if the atlas doesn't have them"""
         self.search_results.ClearAll()
         self.image_list.RemoveAll()
-        search_str = self.search_DB.GetLineText(0)
-        if len(search_str) > 0:
-            # print(" search for images in DB with string:", search_str)
-            results = keyw_db.get_search_data(search_str)
-            # print(f"got {len(results)} results")
-            if len(results) > 0:
-                the_index = 0
-                for result in results:
-                    the_image = wx.Image(io.BytesIO(result[0]), type=wx.BITMAP_TYPE_JPEG)
-                    w, h = the_image.GetSize()
-                    if w < 256:
-                        dx = round((256 - w)/2)
-                        dy = 0
-                    else:
-                        dx = 0
-                        dy = round((256 - h)/2)
-                    self.image_list.Add(wx.Bitmap(the_image.Resize((256, 256), (dx, dy), red=-1, green=-1, blue=-1)))
-                    self.search_results.InsertItem(the_index, result[1], the_index)
-                    the_index += 1
+        # the thumbnail from the atlas doesn't need decoding
+        tiles = {file_name: core.atlas.tile(file_name) for file_name in file_names} if core.atlas is not None else {}
+        thumbnails = {file_name: thumbnail for thumbnail, file_name in
+                      core.db.get_thumbnails([x for x in file_names if tiles.get(x) is None])}
+        the_index = 0
+        for file_name in file_names:
+            the_tile = tiles.get(file_name)
+            if the_tile is not None:
+                self.image_list.Add(wx.Bitmap.FromBuffer(TILE_SIZE, TILE_SIZE, the_tile))
+            elif file_name in thumbnails:
+                self.image_list.Add(wx.Bitmap(self.__letterboxed_thumbnail(file_name, thumbnails[file_name])))
+            else:
+                # the image has been removed from DB since the search
+                continue
+            self.search_results.InsertItem(the_index, file_name, the_index)
+            the_index += 1
+
+    @staticmethod
+    def __letterboxed_thumbnail(file_name: str, jpg_data: bytes) -> wx.Image:
+        """the thumbnail from DB in the middle of 256x256 square, it goes to the atlas if it is used"""
+        the_image = wx.Image(io.BytesIO(jpg_data), type=wx.BITMAP_TYPE_JPEG)
+        w, h = the_image.GetSize()
+        if w < 256:
+            dx = round((256 - w)/2)
+            dy = 0
+        else:
+            dx = 0
+            dy = round((256 - h)/2)
+        if core.atlas is None:
+            return the_image.Resize((256, 256), (dx, dy), red=-1, green=-1, blue=-1)
+        # the atlas tiles have no transparency
+        the_image = the_image.Resize((TILE_SIZE, TILE_SIZE), (dx, dy), *TILE_FILL)
+        core.atlas.append(file_name, bytes(the_image.GetData()))
+        return the_image
+
+    def find_similar_images(self):
+        """show the images in DB which look like the current one, the search is made in the worker thread"""
+        if len(self.shown_file) == 0:
+            return
+        rel_name = self.shown_file
+        self.the_frame.status_bar.SetStatusText(f"looking for the images similar to {rel_name}...")
+        # the similar images replace the search results
+        self.__search_generation += 1
+        generation = self.__search_generation
+        core.cancel_search()
+
+        def do_find(generation: int):
+            # the new thumbnails are hashed on the first search, it may take a while
+            found = core.similar_images(rel_name)
+            results = [file_name for _, file_name in found]
+            wx.CallAfter(self.__similar_images_found, generation, rel_name, results)
+
+        threading.Thread(target=do_find, args=(generation,), name='keyw_similar', daemon=True).start()
+
+    def __similar_images_found(self, generation: int, rel_name: str, results: list):
+        """show the similar images unless the other search or similar images search has been started since"""
+        if generation != self.__search_generation:
+            return
+        self.__show_search_results(results)
+        self.the_frame.status_bar.SetStatusText(f"{len(results)} images look like {rel_name}")
 
     def populate_text_fields_using_search_results(self):
         if self.search_results.GetSelectedItemCount() > 0:
@@ -770,14 +1014,12 @@ class KeywDispatcher:
                 selected_files_list.append(data.Text)
                 item = self.search_results.GetNextSelected(item)
 
-            imgs_data = keyw_db.get_imgs_metadata(selected_files_list)
+            imgs_data = core.merged_keywords(selected_files_list)
 
-            i = 6
-            for widget in self.keyw_edits:
-                if len(imgs_data[i]) > 0:
-                    # print(i, imgs_data[i])
-                    widget.append_words(imgs_data[i])
-                i += 1
+            for widget, column in zip(self.keyw_edits, KEYWORD_COLUMNS):
+                if len(imgs_data[column]) > 0:
+                    # print(column, imgs_data[column])
+                    widget.append_words(imgs_data[column])
 
             self.__format_keywords()
             self.__rm_keywords_duplicates()
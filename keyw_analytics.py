@@ -0,0 +1,312 @@
+#!/usr/bin/python3
+"""keywords analytics of the keyw database: which keywords and fields the catalog is made of
+
+The keywords of all the images are loaded once into the flat columns:
+the word id of every keyword and the number of keywords in every field of
+every image. Everything else is counted over these columns in a few passes,
+with NumPy if it is installed, else with plain python (slower, the same result).
+
+The report is json:
+  frequency            the most used words: times, images, fields
+  fields               keywords, images and distinct words of every keywords field
+  keywords_per_image   distinct keywords of the image: mean, percentiles, histogram
+  agencies             the images over max_keywords of the [export:<agency>] profiles
+  outliers             the rare words, and the rare ones which look like a misspelled common word
+
+usage: keyw_analytics.py [--output <json file>] [--top 100]"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import argparse
+import array
+import collections
+import time
+
+from keyw_db import KEYWORD_COLUMNS
+from keyw_db import KeywDB
+from keyw_keywords import get_default_normalizer
+from keyw_keywords import singular
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+N_FIELDS = len(KEYWORD_COLUMNS)
+# the words used that many times or less are rare
+RARE_COUNT = 2
+# the rare word is misspelled if it is one letter away from the word used that many times or more
+COMMON_COUNT = 20
+# the shorter words are too close to each other to say which one is misspelled
+MIN_MISSPELLED_LENGTH = 4
+TOP_WORDS = 100
+HISTOGRAM_BIN = 5
+
+
+def deletes(word: str) -> set:
+    """the word and the words made from it with one letter removed"""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """True if b is a with one letter inserted, removed, replaced or two neighbour letters swapped"""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return a == b
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1 and
+                                  a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def distinct(values):
+    """sorted distinct values of the numpy array
+
+    numpy.unique may hash the values instead of sorting them, it is many times slower with millions of them"""
+    values = numpy.sort(values)
+    return values[numpy.concatenate(([True], values[1:] != values[:-1]))] if len(values) > 0 else values
+
+
+class KeywordAnalytics:
+    """the keywords of all the images in the columns, and the statistics over them"""
+    def __init__(self):
+        self.file_names = []
+        # word id is the index
+        self.words = []
+        self.__word_ids = array.array('i')
+        # number of keywords in the field of the image, image by image, field by field
+        self.__line_lengths = array.array('i')
+        self.load_time = 0.
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def load(self, keyw_db: KeywDB, chunk_size: int = 5000):
+        """read the keywords of all the images from DB"""
+        t0 = time.perf_counter()
+        # the new word gets the next id
+        ids = collections.defaultdict()
+        ids.default_factory = ids.__len__
+        get_id = ids.__getitem__
+        file_names = []
+        word_ids = array.array('i')
+        line_lengths = array.array('i')
+        for row in keyw_db.iter_images_data(columns=('file_name',) + KEYWORD_COLUMNS, chunk_size=chunk_size):
+            file_names.append(row[0])
+            for the_line in row[1:]:
+                if the_line is None:
+                    line_lengths.append(0)
+                    continue
+                words = the_line.split()
+                word_ids.extend(map(get_id, words))
+                line_lengths.append(len(words))
+        self.file_names = file_names
+        self.words = list(ids)
+        self.__word_ids = word_ids
+        self.__line_lengths = line_lengths
+        self.load_time = time.perf_counter() - t0
+
+    def __columns(self) -> tuple:
+        """(word id, image, field) of every keyword, numpy arrays or python lists"""
+        if numpy is not None:
+            word_ids = numpy.asarray(self.__word_ids, dtype=numpy.int64)
+            line_ids = numpy.repeat(numpy.arange(len(self.__line_lengths)), numpy.asarray(self.__line_lengths))
+            return word_ids, line_ids // N_FIELDS, line_ids % N_FIELDS
+        image_ids = []
+        field_ids = []
+        for line_id, length in enumerate(self.__line_lengths):
+            image_ids.extend([line_id // N_FIELDS] * length)
+            field_ids.extend([line_id % N_FIELDS] * length)
+        return list(self.__word_ids), image_ids, field_ids
+
+    def __key_ids(self) -> list:
+        """the id of the normalized word for every word id: the words which are duplicates share it"""
+        normalizer = get_default_normalizer()
+        keys = collections.defaultdict()
+        keys.default_factory = keys.__len__
+        return [keys[normalizer.key(word)] for word in self.words]
+
+    def __per_image(self, key_ids, word_ids, image_ids, field_ids, fields: list):
+        """number of distinct keywords of every image in the fields"""
+        field_idx = [KEYWORD_COLUMNS.index(field) for field in fields if field in KEYWORD_COLUMNS]
+        n_keys = max(key_ids) + 1 if len(key_ids) > 0 else 1
+        if numpy is not None:
+            mask = numpy.isin(field_ids, field_idx)
+            pairs = distinct(image_ids[mask] * n_keys + key_ids[word_ids[mask]])
+            return numpy.bincount(pairs // n_keys, minlength=len(self))
+        field_idx = set(field_idx)
+        pairs = {image * n_keys + key_ids[word] for word, image, field in zip(word_ids, image_ids, field_ids)
+                 if field in field_idx}
+        counts = [0] * len(self)
+        for pair in pairs:
+            counts[pair // n_keys] += 1
+        return counts
+
+    @staticmethod
+    def __distribution(counts) -> dict:
+        """mean, percentiles and histogram of the keywords per image"""
+        if len(counts) == 0:
+            return {'mean': 0, 'median': 0, 'p90': 0, 'p99': 0, 'max': 0, 'histogram': []}
+        if numpy is not None:
+            p50, p90, p99 = (int(x) for x in numpy.percentile(counts, (50, 90, 99), method='lower'))
+            histogram = numpy.bincount(counts // HISTOGRAM_BIN).tolist()
+            mean, top = float(counts.mean()), int(counts.max())
+        else:
+            ordered = sorted(counts)
+            p50, p90, p99 = (ordered[(len(ordered) - 1) * p // 100] for p in (50, 90, 99))
+            histogram = [0] * (ordered[-1] // HISTOGRAM_BIN + 1)
+            for n in counts:
+                histogram[n // HISTOGRAM_BIN] += 1
+            mean, top = sum(counts) / len(counts), ordered[-1]
+        return {'mean': round(mean, 2), 'median': p50, 'p90': p90, 'p99': p99, 'max': top,
+                'histogram': [[i * HISTOGRAM_BIN, n] for i, n in enumerate(histogram) if n > 0]}
+
+    def __misspelled(self, counts: list, key_ids, rare_count: int, common_count: int) -> dict:
+        """rare word id -> the common word id it looks like
+
+        The word is not misspelled if it is the other form of the common one: the same
+        for the keywords normalizer, or the same in the other case or in the singular."""
+        common = {}
+        for word_id, n in enumerate(counts):
+            if n >= common_count:
+                for variant in deletes(self.words[word_id].lower()):
+                    common.setdefault(variant, []).append(word_id)
+        found = {}
+        for word_id, n in enumerate(counts):
+            word = self.words[word_id].lower()
+            if n == 0 or n > rare_count or len(word) < MIN_MISSPELLED_LENGTH:
+                continue
+            candidates = {x for variant in deletes(word) for x in common.get(variant, ())
+                          if within_one_edit(word, self.words[x].lower())}
+            if any(key_ids[x] == key_ids[word_id] or self.words[x].lower() == word
+                   or singular(self.words[x].lower()) == singular(word) for x in candidates):
+                continue
+            candidates.discard(word_id)
+            if len(candidates) > 0:
+                found[word_id] = max(candidates, key=lambda x: counts[x])
+        return found
+
+    def report(self, profiles: list = (), top: int = TOP_WORDS, rare_count: int = RARE_COUNT,
+               common_count: int = COMMON_COUNT) -> dict:
+        """the keywords statistics as a json-ready dict, profiles are the export profiles to check"""
+        t0 = time.perf_counter()
+        n_words = len(self.words)
+        word_ids, image_ids, field_ids = self.__columns()
+        key_ids = self.__key_ids()
+        if numpy is not None:
+            key_ids = numpy.asarray(key_ids, dtype=numpy.int64)
+            counts = numpy.bincount(word_ids, minlength=n_words)
+            by_field = numpy.bincount(word_ids * N_FIELDS + field_ids,
+                                      minlength=n_words * N_FIELDS).reshape(n_words, N_FIELDS)
+            # every (image, word) once
+            pairs = distinct(image_ids * max(n_words, 1) + word_ids)
+            images = numpy.bincount(pairs % max(n_words, 1), minlength=n_words)
+            # every word is used at least once, so every one gets its first keyword
+            first = numpy.full(n_words, len(word_ids), dtype=numpy.int64)
+            numpy.minimum.at(first, word_ids, numpy.arange(len(word_ids)))
+            first_image = image_ids[first]
+            field_keywords = numpy.bincount(field_ids, minlength=N_FIELDS)
+            lines = numpy.asarray(self.__line_lengths).reshape(-1, N_FIELDS) if len(self) > 0 \
+                else numpy.zeros((0, N_FIELDS), dtype=numpy.int32)
+            field_images = (lines > 0).sum(axis=0)
+            field_distinct = (by_field > 0).sum(axis=0)
+            order = numpy.argsort(-counts, kind='stable')[:top]
+            counts, images, first_image = counts.tolist(), images.tolist(), first_image.tolist()
+            by_field, field_keywords = by_field.tolist(), field_keywords.tolist()
+            field_images, field_distinct = field_images.tolist(), field_distinct.tolist()
+        else:
+            counts = [0] * n_words
+            by_field = [[0] * N_FIELDS for _ in range(n_words)]
+            first_image = [-1] * n_words
+            pairs = set()
+            for word, image, field in zip(word_ids, image_ids, field_ids):
+                counts[word] += 1
+                by_field[word][field] += 1
+                if first_image[word] < 0:
+                    first_image[word] = image
+                pairs.add(image * n_words + word)
+            images = [0] * n_words
+            for pair in pairs:
+                images[pair % n_words] += 1
+            field_keywords = [sum(row[i] for row in by_field) for i in range(N_FIELDS)]
+            field_images = [sum(1 for n in self.__line_lengths[i::N_FIELDS] if n > 0) for i in range(N_FIELDS)]
+            field_distinct = [sum(1 for row in by_field if row[i] > 0) for i in range(N_FIELDS)]
+            order = sorted(range(n_words), key=lambda x: -counts[x])[:top]
+
+        def word_info(word_id) -> dict:
+            return {'word': self.words[word_id], 'count': counts[word_id], 'images': images[word_id],
+                    'fields': {field: n for field, n in zip(KEYWORD_COLUMNS, by_field[word_id]) if n > 0}}
+
+        per_image = self.__per_image(key_ids, word_ids, image_ids, field_ids, list(KEYWORD_COLUMNS))
+        agencies = {}
+        for profile in profiles:
+            agency_counts = self.__per_image(key_ids, word_ids, image_ids, field_ids, profile.keyword_fields)
+            agency = {'max_keywords': profile.max_keywords, 'fields': profile.keyword_fields,
+                      'keywords_per_image': self.__distribution(agency_counts)}
+            if profile.max_keywords > 0:
+                if numpy is not None:
+                    over = numpy.flatnonzero(agency_counts > profile.max_keywords).tolist()
+                else:
+                    over = [i for i, n in enumerate(agency_counts) if n > profile.max_keywords]
+                over.sort(key=lambda i: -agency_counts[i])
+                agency['over_limit'] = len(over)
+                agency['over_limit_images'] = [{'file_name': self.file_names[i], 'keywords': int(agency_counts[i])}
+                                               for i in over[:top]]
+            agencies[profile.name] = agency
+
+        misspelled = self.__misspelled(counts, key_ids, rare_count, common_count)
+        rare = [word_id for word_id in range(n_words)
+                if 0 < counts[word_id] <= rare_count and word_id not in misspelled]
+        n_rare = len(rare)
+        rare.sort(key=lambda x: (counts[x], self.words[x].lower()))
+
+        return {
+            'images': len(self),
+            'tagged_images': int(sum(1 for n in per_image if n > 0)),
+            'keywords': len(self.__word_ids),
+            'words': n_words,
+            'frequency': [word_info(word_id) for word_id in order],
+            'fields': {field: {'keywords': field_keywords[i], 'images': field_images[i],
+                               'distinct': field_distinct[i]}
+                       for i, field in enumerate(KEYWORD_COLUMNS)},
+            'keywords_per_image': self.__distribution(per_image),
+            'agencies': agencies,
+            'outliers': {
+                'rare_count': rare_count,
+                'rare': n_rare,
+                'rare_words': [{'word': self.words[x], 'count': counts[x],
+                                'file_name': self.file_names[first_image[x]]} for x in rare[:top]],
+                'misspelled': [{'word': self.words[x], 'count': counts[x],
+                                'file_name': self.file_names[first_image[x]],
+                                'like': self.words[like], 'like_count': counts[like]}
+                               for x, like in sorted(misspelled.items(), key=lambda item: -counts[item[1]])],
+            },
+            'seconds': {'load': round(self.load_time, 3), 'analysis': round(time.perf_counter() - t0, 3),
+                        'numpy': numpy is not None},
+        }
+
+
+def export_profiles(config) -> list:
+    """the export profiles of all the agencies in keyw.ini"""
+    from keyw_export import ExportProfile
+    return [ExportProfile.from_config(config, section[len('export:'):])
+            for section in config.sections() if section.startswith('export:')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="keywords analytics of keyw database as json")
+    parser.add_argument('--output', help="json file to write the report to instead of the standard output")
+    parser.add_argument('--top', type=int, default=TOP_WORDS, help="how many words to list")
+    args = parser.parse_args()
+
+    from keyw_cli import main
+    main(['analytics', '--top', str(args.top)] + (['--output', args.output] if args.output is not None else []))
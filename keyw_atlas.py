@@ -0,0 +1,166 @@
+"""thumbnail atlas: the search results thumbnails ready to show, without jpeg decoding
+
+The atlas file is a sequence of 256x256 RGB tiles, the thumbnails are already
+letterboxed to the square, so the tile is turned into the bitmap straight from
+the memory-mapped file. The offset table is the .idx file next to it, one line
+"<tile number>\\t<file name>" per appended tile. The later line wins, and
+the tile number -1 means the image has been removed.
+
+The replaced tiles stay in the file until compact(). The atlas is on with
+THUMBNAIL_ATLAS = yes in keyw.ini, and keyw_cli.py atlas rebuild makes it from DB."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import io
+import mmap
+import os
+
+from keyw_db import KeywDB
+
+
+ATLAS_FILE = 'thumbnails.atlas'
+TILE_SIZE = 256
+TILE_BYTES = TILE_SIZE * TILE_SIZE * 3
+# the letterbox colour
+TILE_FILL = (255, 255, 255)
+
+
+def pillow_rgb_tile(jpg_data: bytes, fill: tuple = TILE_FILL) -> bytes:
+    """the jpg thumbnail letterboxed to the tile, made with Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Error: making the thumbnail atlas without GUI needs Pillow, please install it:")
+        print("  pip install Pillow")
+        exit(1)
+    with Image.open(io.BytesIO(jpg_data)) as the_image:
+        the_image = the_image.convert('RGB')
+        the_image.thumbnail((TILE_SIZE, TILE_SIZE))
+        the_tile = Image.new('RGB', (TILE_SIZE, TILE_SIZE), fill)
+        the_tile.paste(the_image, ((TILE_SIZE - the_image.width) // 2, (TILE_SIZE - the_image.height) // 2))
+        return the_tile.tobytes()
+
+
+class ThumbnailAtlas:
+    """memory-mapped file of the fixed size RGB tiles indexed by the image file name"""
+    def __init__(self, atlas_file: str):
+        self.atlas_file = atlas_file
+        self.index_file = atlas_file + '.idx'
+        # file name -> tile number
+        self.__tiles = {}
+        self.__n_tiles = 0
+        self.__map = None
+        self.__n_mapped = 0
+        self.__load_index()
+
+    def __len__(self):
+        return len(self.__tiles)
+
+    def __contains__(self, file_name: str):
+        return file_name in self.__tiles
+
+    def garbage(self) -> int:
+        """number of the tiles which are not used anymore"""
+        return self.__n_tiles - len(self.__tiles)
+
+    def __load_index(self):
+        self.__tiles = {}
+        self.__n_tiles = 0
+        if os.path.exists(self.atlas_file):
+            self.__n_tiles = os.path.getsize(self.atlas_file) // TILE_BYTES
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, encoding='utf-8') as f:
+            for line in f:
+                tile, _, file_name = line.rstrip('\n').partition('\t')
+                tile = int(tile)
+                if tile < 0:
+                    self.__tiles.pop(file_name, None)
+                elif tile < self.__n_tiles:
+                    # the tile is there only if the atlas was written before the index
+                    self.__tiles[file_name] = tile
+
+    def tile(self, file_name: str):
+        """memoryview of the tile RGB data in the mapped file or None"""
+        tile = self.__tiles.get(file_name)
+        if tile is None:
+            return None
+        if tile >= self.__n_mapped:
+            self.__remap()
+        return memoryview(self.__map)[tile * TILE_BYTES:(tile + 1) * TILE_BYTES]
+
+    def __remap(self):
+        # the old map is closed by the garbage collector when the last tile view is gone
+        self.__map = None
+        self.__n_mapped = 0
+        if self.__n_tiles == 0:
+            return
+        with open(self.atlas_file, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__n_mapped = len(self.__map) // TILE_BYTES
+
+    def append(self, file_name: str, rgb_data: bytes):
+        """add the tile of the image, the old one becomes garbage"""
+        if len(rgb_data) != TILE_BYTES:
+            print(f"Error: the {file_name} tile is {len(rgb_data)} bytes instead of {TILE_BYTES}!")
+            return
+        with open(self.atlas_file, 'r+b' if os.path.exists(self.atlas_file) else 'wb') as f:
+            # after the interrupted append the file may end with the part of the tile
+            f.seek(self.__n_tiles * TILE_BYTES)
+            f.write(rgb_data)
+        with open(self.index_file, 'a', encoding='utf-8') as f:
+            f.write(f"{self.__n_tiles}\t{file_name}\n")
+        self.__tiles[file_name] = self.__n_tiles
+        self.__n_tiles += 1
+
+    def remove(self, file_name: str):
+        if self.__tiles.pop(file_name, None) is not None:
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(f"-1\t{file_name}\n")
+
+    def on_image_saved(self, old_data, new_data):
+        """KeywDB insert hook: the thumbnail may have been changed, the tile is made again when needed"""
+        self.remove(new_data[0])
+
+    def compact(self, keep=None) -> int:
+        """rewrite the atlas without the garbage tiles and without the images not in keep, return the tiles removed"""
+        names = sorted((tile, file_name) for file_name, tile in self.__tiles.items()
+                       if keep is None or file_name in keep)
+        n_removed = self.__n_tiles - len(names)
+        if n_removed == 0:
+            return 0
+        self.__remap()
+        tiles = self.__map
+        self.__write(((file_name, tiles[tile * TILE_BYTES:(tile + 1) * TILE_BYTES]) for tile, file_name in names))
+        return n_removed
+
+    def rebuild(self, keyw_db: KeywDB, rgb_tile=None) -> int:
+        """make the atlas again from all the thumbnails in DB, return the number of tiles
+
+        rgb_tile(jpg_data) -> tile data, the default is made with Pillow"""
+        if rgb_tile is None:
+            rgb_tile = pillow_rgb_tile
+        return self.__write((file_name, rgb_tile(thumbnail)) for file_name, thumbnail in keyw_db.iter_thumbnails())
+
+    def __write(self, tiles) -> int:
+        """write the tiles (file_name, rgb_data) to the new files and replace the atlas with them"""
+        tmp_atlas = self.atlas_file + '.tmp'
+        tmp_index = self.index_file + '.tmp'
+        n_tiles = 0
+        with open(tmp_atlas, 'wb') as f_atlas, open(tmp_index, 'w', encoding='utf-8') as f_index:
+            for file_name, rgb_data in tiles:
+                if len(rgb_data) != TILE_BYTES:
+                    print(f"Error: the {file_name} tile is {len(rgb_data)} bytes instead of {TILE_BYTES}!")
+                    continue
+                f_atlas.write(rgb_data)
+                f_index.write(f"{n_tiles}\t{file_name}\n")
+                n_tiles += 1
+        self.__map = None
+        self.__n_mapped = 0
+        os.replace(tmp_atlas, self.atlas_file)
+        os.replace(tmp_index, self.index_file)
+        self.__load_index()
+        return n_tiles
@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+"""keyw application command line interface for the batch jobs, no GUI needed
+
+usage:
+  keyw_cli.py list <dir>                      list jpegs and whether they have data in DB
+  keyw_cli.py show <image>                    print the image data as json
+  keyw_cli.py set <image> [--concept ...]     set the image fields and save to DB
+  keyw_cli.py copy <from image> <images...>   copy the keywords from one image to others
+  keyw_cli.py search <words>                  search DB for the images with all the words
+  keyw_cli.py similar <image> [-k 20]         find the images in DB which look like the image
+  keyw_cli.py export <agency> <output>        export DB for the stock agency
+  keyw_cli.py atlas rebuild|compact           make the thumbnail atlas from DB or remove its unused tiles
+  keyw_cli.py shard                           move the images from the main DB to the shards of their years
+  keyw_cli.py serve [--port <port>]           run the local read-only HTTP/JSON service
+  keyw_cli.py maintain [--report]             DB health report, ANALYZE and vacuum
+  keyw_cli.py analytics [--output <file>]     keywords statistics as json"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import argparse
+import json
+import os
+
+from keyw_core import KeywCore
+from keyw_core import read_config
+from keyw_db import IMG_DATA_COLUMNS
+from keyw_db import KEYWORD_COLUMNS
+
+
+def do_list(core: KeywCore, args):
+    core.files.set_recursive(args.recursive or core.files.recursive)
+    core.set_working_dir(args.dir)
+    for rel_name in core.file_names():
+        status = 'tagged' if core.load_record(rel_name) is not None else '-'
+        print(f"{status}\t{rel_name}")
+
+
+def __open_image(core: KeywCore, the_image: str) -> str:
+    """make the image directory the working one, return the image name relative to it"""
+    if not os.path.isfile(the_image):
+        print(f"Error: the file {the_image} does not exist!")
+        exit(1)
+    core.set_working_dir(os.path.dirname(os.path.abspath(the_image)))
+    return os.path.basename(the_image)
+
+
+def do_show(core: KeywCore, args):
+    rel_name = __open_image(core, args.image)
+    record = core.load_record(rel_name)
+    if record is None:
+        print(f"Error: there is no data for {args.image} in DB")
+        exit(1)
+    print(json.dumps(record, indent=2, ensure_ascii=False))
+
+
+def do_set(core: KeywCore, args):
+    rel_name = __open_image(core, args.image)
+    record = core.load_record(rel_name)
+    if record is None:
+        record = core.empty_record()
+    for column in IMG_DATA_COLUMNS[1:]:
+        value = getattr(args, column)
+        if value is not None:
+            record[column] = value
+    if core.save_record(rel_name, core.process_keywords(record), args.replace) == 0:
+        exit(1)
+
+
+def do_copy(core: KeywCore, args):
+    source = core.load_record(__open_image(core, args.source))
+    if source is None:
+        print(f"Error: there is no data for {args.source} in DB")
+        exit(1)
+    n_failed = 0
+    for the_image in args.images:
+        rel_name = __open_image(core, the_image)
+        record = core.load_record(rel_name)
+        if record is None:
+            record = core.empty_record()
+        for column in KEYWORD_COLUMNS:
+            record[column] = source[column]
+        # the title and description are kept if the image has them
+        for column in ('title', 'description'):
+            if len(record[column]) == 0:
+                record[column] = source[column]
+        if core.save_record(rel_name, core.process_keywords(record), args.replace) == 0:
+            n_failed += 1
+    if n_failed > 0:
+        print(f"Error: the data of {n_failed} of {len(args.images)} images is not saved")
+        exit(1)
+
+
+def do_search(core: KeywCore, args):
+    for file_name in core.search(' '.join(args.words)):
+        print(file_name)
+
+
+def do_similar(core: KeywCore, args):
+    for distance, file_name in core.similar_images(__open_image(core, args.image), args.k):
+        print(f"{distance}\t{file_name}")
+
+
+def do_atlas(core: KeywCore, args):
+    from keyw_atlas import ATLAS_FILE
+    from keyw_atlas import ThumbnailAtlas
+    atlas = core.atlas
+    if atlas is None:
+        print("Note: the atlas is not used by keyw until THUMBNAIL_ATLAS = yes is set in keyw.ini")
+        atlas = ThumbnailAtlas(os.path.join(core.release_dir, ATLAS_FILE))
+    if args.action == 'rebuild':
+        print(f"{atlas.rebuild(core.db)} thumbnails written to {atlas.atlas_file}")
+    else:
+        in_db = {row[0] for row in core.db.iter_images_data(columns=('file_name',))}
+        print(f"{atlas.compact(in_db)} unused tiles removed from {atlas.atlas_file}")
+
+
+def do_export(core: KeywCore, args):
+    from keyw_export import CatalogExporter
+    from keyw_export import ExportProfile
+    exporter = CatalogExporter(core.db, ExportProfile.from_config(core.config, args.agency))
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        n = exporter.write(f)
+    print(f"{n} images exported to {args.output}")
+
+
+def do_shard(core: KeywCore, args):
+    moved = core.db.migrate_to_shards()
+    for shard, n in moved.items():
+        print(f"{shard}: {n} images")
+    print(f"{sum(moved.values())} images moved to the shards, run VACUUM on {core.db.THE_DB_FILE} to shrink it")
+    if not core.db.sharding:
+        print("Note: set DB_SHARDS = year in keyw.ini, so the new images go to the shards too")
+
+
+def do_serve(core: KeywCore, args):
+    from keyw_server import serve
+    serve(core.db, core.config, args.port)
+
+
+def do_maintain(core: KeywCore, args):
+    from keyw_maintain import maintain
+    maintain(core.db, args.report, args.thumbnail_quality)
+
+
+def do_analytics(core: KeywCore, args):
+    from keyw_analytics import KeywordAnalytics
+    from keyw_analytics import export_profiles
+    analytics = KeywordAnalytics()
+    analytics.load(core.db)
+    the_report = analytics.report(export_profiles(core.config), top=args.top)
+    if args.output is None:
+        print(json.dumps(the_report, indent=1, ensure_ascii=False))
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(the_report, f, indent=1, ensure_ascii=False)
+        print(f"keywords of {the_report['images']} images analysed in "
+              f"{the_report['seconds']['load'] + the_report['seconds']['analysis']:.1f} s, "
+              f"the report is written to {args.output}")
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="keyw image keywords editor, command line interface")
+    parser.add_argument('--ini', default='', help="keyw.ini file to use instead of the default one")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    the_command = commands.add_parser('list', help="list jpegs and whether they have data in DB")
+    the_command.add_argument('dir')
+    the_command.add_argument('-r', '--recursive', action='store_true')
+    the_command.set_defaults(func=do_list)
+
+    the_command = commands.add_parser('show', help="print the image data as json")
+    the_command.add_argument('image')
+    the_command.set_defaults(func=do_show)
+
+    the_command = commands.add_parser('set', help="set the image fields and save to DB")
+    the_command.add_argument('image')
+    for column in IMG_DATA_COLUMNS[1:]:
+        the_command.add_argument(f'--{column}')
+    the_command.add_argument('--replace', action='store_true',
+                             help="replace the data of the image with the same name but other content")
+    the_command.set_defaults(func=do_set)
+
+    the_command = commands.add_parser('copy', help="copy the keywords from one image to others")
+    the_command.add_argument('source')
+    the_command.add_argument('images', nargs='+')
+    the_command.add_argument('--replace', action='store_true',
+                             help="replace the data of the images with the same name but other content")
+    the_command.set_defaults(func=do_copy)
+
+    the_command = commands.add_parser('search', help="search DB for the images with all the words")
+    the_command.add_argument('words', nargs='+')
+    the_command.set_defaults(func=do_search)
+
+    the_command = commands.add_parser('similar', help="find the images in DB which look like the image")
+    the_command.add_argument('image')
+    the_command.add_argument('-k', type=int, default=20, help="how many images to find")
+    the_command.set_defaults(func=do_similar)
+
+    the_command = commands.add_parser('export', help="export DB for the stock agency")
+    the_command.add_argument('agency')
+    the_command.add_argument('output')
+    the_command.set_defaults(func=do_export)
+
+    the_command = commands.add_parser('atlas', help="make the thumbnail atlas from DB or remove its unused tiles")
+    the_command.add_argument('action', choices=('rebuild', 'compact'))
+    the_command.set_defaults(func=do_atlas)
+
+    the_command = commands.add_parser('shard', help="move the images from the main DB to the shards of their years")
+    the_command.set_defaults(func=do_shard)
+
+    the_command = commands.add_parser('serve', help="run the local read-only HTTP/JSON service")
+    the_command.add_argument('--port', type=int)
+    the_command.set_defaults(func=do_serve)
+
+    the_command = commands.add_parser('maintain', help="DB health report, ANALYZE and vacuum")
+    the_command.add_argument('--report', action='store_true', help="only the report, DB is not changed")
+    the_command.add_argument('--thumbnail-quality', type=int,
+                             help="re-compress the thumbnails with that jpeg quality, the smaller ones are kept")
+    the_command.set_defaults(func=do_maintain)
+
+    the_command = commands.add_parser('analytics', help="keywords statistics as json")
+    the_command.add_argument('--output', help="json file to write the report to instead of the standard output")
+    the_command.add_argument('--top', type=int, default=100, help="how many words to list")
+    the_command.set_defaults(func=do_analytics)
+
+    args = parser.parse_args(argv)
+    # the DB check may change the DB schema, the report only must not
+    check_db = not (args.command == 'maintain' and args.report)
+    args.func(KeywCore(read_config(args.ini), check_db=check_db), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+"""keywords autocomplete for keyw application
+
+Run the module to see how fast it is."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import bisect
+import heapq
+
+
+class PrefixIndex:
+    """sorted array of the known keywords with their usage counts
+
+    The words with the prefix make a continuous range in the sorted array,
+    it is found with bisect. The short prefixes have too many words to rank
+    them on every key press, so their top completions are made in advance
+    and kept up to date on update()."""
+    CACHED_PREFIX_LENGTH = 2
+
+    def __init__(self, counts: dict = None, top_k: int = 10):
+        self.top_k = top_k
+        self.__counts = dict(counts) if counts is not None else {}
+        self.__words = sorted(self.__counts)
+        # short prefix -> top completions
+        self.__top_cache = {}
+        self.__build_top_cache()
+
+    def __len__(self):
+        return len(self.__words)
+
+    def count(self, word: str) -> int:
+        """how many times the word has been used"""
+        return self.__counts.get(word, 0)
+
+    def complete(self, prefix: str, k: int = None) -> list:
+        """the most used words which start with the prefix, the prefix itself is not included"""
+        if k is None:
+            k = self.top_k
+        if len(prefix) == 0:
+            return []
+        if len(prefix) <= self.CACHED_PREFIX_LENGTH and k <= self.top_k:
+            top = self.__top_cache.get(prefix)
+            if top is None:
+                top = self.__rank(prefix, self.top_k)
+                self.__top_cache[prefix] = top
+            return top[:k]
+        return self.__rank(prefix, k)
+
+    def __build_top_cache(self):
+        """top completions for all the short prefixes in one pass over the words"""
+        groups = {}
+        for word in self.__words:
+            for i in range(1, min(len(word) - 1, self.CACHED_PREFIX_LENGTH) + 1):
+                groups.setdefault(word[:i], []).append(word)
+        counts = self.__counts
+        self.__top_cache = {prefix: heapq.nlargest(self.top_k, words, key=lambda x: counts[x])
+                            for prefix, words in groups.items()}
+
+    def __rank(self, prefix: str, k: int) -> list:
+        lo = bisect.bisect_left(self.__words, prefix)
+        hi = bisect.bisect_left(self.__words, prefix + '\U0010ffff', lo)
+        if lo < len(self.__words) and self.__words[lo] == prefix:
+            lo += 1
+        counts = self.__counts
+        return heapq.nlargest(k, self.__words[lo:hi], key=lambda x: counts[x])
+
+    def update(self, words):
+        """add the words of the saved image"""
+        for word in words:
+            if word in self.__counts:
+                self.__counts[word] += 1
+            else:
+                self.__counts[word] = 1
+                bisect.insort(self.__words, word)
+            self.__raise_top(word)
+
+    def remove(self, words):
+        """remove the words of the image which has been replaced"""
+        for word in words:
+            n = self.__counts.get(word, 0)
+            if n > 1:
+                self.__counts[word] = n - 1
+            elif n == 1:
+                del self.__counts[word]
+                del self.__words[bisect.bisect_left(self.__words, word)]
+            self.__forget_top(word)
+
+    def __raise_top(self, word: str):
+        """the word count has grown: put it into the top completions of its short prefixes"""
+        n = self.__counts[word]
+        counts = self.__counts
+        for i in range(1, min(len(word) - 1, self.CACHED_PREFIX_LENGTH) + 1):
+            top = self.__top_cache.get(word[:i])
+            if top is None:
+                continue
+            if word in top:
+                top.sort(key=lambda x: counts[x], reverse=True)
+            elif len(top) < self.top_k or n > counts[top[-1]]:
+                top.append(word)
+                top.sort(key=lambda x: counts[x], reverse=True)
+                del top[self.top_k:]
+
+    def __forget_top(self, word: str):
+        """the word count has gone down, so the top completions of its prefixes may be not valid anymore"""
+        for i in range(1, self.CACHED_PREFIX_LENGTH + 1):
+            top = self.__top_cache.get(word[:i])
+            if top is not None and word in top:
+                del self.__top_cache[word[:i]]
+
+
+# the process-wide completer
+__the_completer = None
+
+
+def get_completer() -> PrefixIndex:
+    """the keywords completer shared by all the text fields"""
+    global __the_completer
+    if __the_completer is None:
+        __the_completer = PrefixIndex()
+    return __the_completer
+
+
+def set_completer(completer: PrefixIndex):
+    """use the completer built from the keywords in DB"""
+    global __the_completer
+    __the_completer = completer
+
+
+def __benchmark():
+    """500k words vocabulary, time for the top 10 completions"""
+    import random
+    import string
+    import time
+
+    random.seed(1)
+    counts = {}
+    while len(counts) < 500000:
+        word = ''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 12)))
+        counts[word] = int(random.paretovariate(1.2))
+    t0 = time.perf_counter()
+    index = PrefixIndex(counts)
+    print(f"index of {len(index)} words built in {time.perf_counter() - t0:.2f} s")
+    prefixes = [''.join(random.choices(string.ascii_lowercase, k=n)) for n in (1, 2, 3, 4, 5) for _ in range(200)]
+    for n in (1, 2, 3, 4, 5):
+        the_prefixes = [x for x in prefixes if len(x) == n]
+        index.complete(the_prefixes[0])
+        t0 = time.perf_counter()
+        for prefix in the_prefixes:
+            index.complete(prefix)
+        dt = (time.perf_counter() - t0) / len(the_prefixes)
+        print(f"prefix length {n}: {dt * 1e6:8.1f} us per top-10 completion")
+    t0 = time.perf_counter()
+    index.update(['newword', 'another', 'abc'])
+    print(f"update with 3 words: {(time.perf_counter() - t0) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    __benchmark()
@@ -0,0 +1,263 @@
+"""keyw application core: files, thumbnails, image data, keywords and database
+
+No wx here: the GUI is a thin layer over KeywCore, and keyw_cli.py uses it for the batch jobs."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import atexit
+import concurrent.futures
+import configparser
+import io
+import os
+
+from keyw_atlas import ATLAS_FILE
+from keyw_atlas import ThumbnailAtlas
+from keyw_db import IMG_DATA_COLUMNS
+from keyw_db import KEYWORD_COLUMNS
+from keyw_db import KeywDB
+from keyw_files import FileIndex
+from keyw_keywords import KeywordNormalizer
+from keyw_keywords import collapse_spaces
+from keyw_keywords import set_default_normalizer
+from keyw_perf import latency
+from keyw_perf import timed
+from keyw_releases import ReleaseIndex
+from keyw_similar import SimilarityIndex
+from keyw_vocab import Vocabulary
+
+
+APP_DIR = os.path.dirname(os.path.realpath(__file__))
+
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 50
+# the thumbnails of the batch are made in parallel
+THUMBNAIL_WORKERS = 4
+
+
+def read_config(ini_file: str = '') -> configparser.ConfigParser:
+    """read keyw.ini, by default the one in the application directory"""
+    config = configparser.ConfigParser()
+    config.read(ini_file if len(ini_file) > 0 else os.path.join(APP_DIR, 'keyw.ini'))
+    return config
+
+
+def pillow_thumbnail(f_name: str) -> bytes:
+    """returns the thumbnail of the jpg file as a binary jpg data, made with Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Error: making thumbnails without GUI needs Pillow, please install it:")
+        print("  pip install Pillow")
+        exit(1)
+    with Image.open(f_name) as the_image:
+        with latency.measure('image decode'):
+            # let the jpeg decoder do the most of downscaling
+            the_image.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            the_image = the_image.convert('RGB')
+        with latency.measure('image scale'):
+            the_image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        with latency.measure('thumbnail encode'):
+            the_data = io.BytesIO()
+            the_image.save(the_data, 'JPEG', quality=THUMBNAIL_QUALITY)
+    return the_data.getvalue()
+
+
+class KeywCore:
+    """everything the keyw application does with the images, without GUI"""
+    def __init__(self, config: configparser.ConfigParser = None, thumbnailer=None, check_db: bool = True):
+        if config is None:
+            config = read_config()
+        self.config = config
+        self.release_dir = config.get('keyw', 'RELEASE_DIR', fallback=os.path.expanduser('~'))
+        self.skip_duplicates = config.getboolean('keyw', 'SKIP_DUPLICATES', fallback=False)
+
+        # latency histograms of the operations, written to LATENCY_JSON on exit
+        latency.enabled = config.getboolean('keyw', 'LATENCY_STATS', fallback=False)
+        latency_json = config.get('keyw', 'LATENCY_JSON', fallback='')
+        if latency.enabled and len(latency_json) > 0:
+            atexit.register(latency.dump_json, os.path.expanduser(latency_json))
+
+        # how to find duplicates in keywords
+        self.normalizer = KeywordNormalizer(
+            fold_case=config.getboolean('keyw', 'KEYWORDS_FOLD_CASE', fallback=False),
+            fold_plurals=config.getboolean('keyw', 'KEYWORDS_FOLD_PLURALS', fallback=False),
+            lemmatize=config.getboolean('keyw', 'KEYWORDS_LEMMATIZE', fallback=False))
+        set_default_normalizer(self.normalizer)
+
+        # the GUI checks DB after the window is shown
+        self.db = KeywDB(self.release_dir, check=check_db,
+                         search_cache_size=config.getint('keyw', 'SEARCH_CACHE_SIZE', fallback=64),
+                         sharding=config.get('keyw', 'DB_SHARDS', fallback='none') == 'year')
+        self.files = FileIndex(recursive=config.getboolean('keyw', 'RECURSIVE', fallback=False))
+        self.releases = ReleaseIndex(self.release_dir)
+
+        # keywords vocabulary, it is loaded by the one who needs it
+        self.vocabulary = Vocabulary()
+        self.db.insert_hooks.append(self.vocabulary.on_image_saved)
+
+        # perceptual hashes of the thumbnails for the similar images search
+        self.similar = SimilarityIndex(self.db)
+        self.db.insert_hooks.append(self.similar.on_image_saved)
+
+        # the search results thumbnails decoded in advance
+        self.atlas = None
+        if config.getboolean('keyw', 'THUMBNAIL_ATLAS', fallback=False):
+            self.atlas = ThumbnailAtlas(os.path.join(self.release_dir, ATLAS_FILE))
+            self.db.insert_hooks.append(self.atlas.on_image_saved)
+
+        # the searches started with search_async(), only the last one counts
+        self.__search_executor = None
+        self.__search_generation = 0
+
+        # thumbnailer(f_name) -> jpg data, the GUI uses its own
+        self.thumbnailer = thumbnailer if thumbnailer is not None else pillow_thumbnail
+
+    def set_working_dir(self, the_dir: str) -> bool:
+        """set the working directory, return True if the list of files has been changed"""
+        return self.files.set_root(the_dir)
+
+    def file_names(self) -> list:
+        """jpeg files of the working directory, relative to it"""
+        return self.files.names(self.skip_duplicates)
+
+    @staticmethod
+    def empty_record() -> dict:
+        """image data with all the fields empty"""
+        return dict.fromkeys(IMG_DATA_COLUMNS, '')
+
+    @timed('release lookup')
+    def releases_for(self, rel_name: str) -> tuple:
+        """(models, property owners) who have the release for the day the image was taken"""
+        the_day = os.path.basename(rel_name).split('_')[0]
+        return self.releases.models(the_day), self.releases.properties(the_day)
+
+    def load_record(self, rel_name: str):
+        """image data from DB as a dict or None
+
+        the image is found by the content fingerprint or by the file name"""
+        img_data = self.db.find_img_metadata(os.path.basename(rel_name), self.files.fingerprint(rel_name))
+        if img_data is None:
+            return None
+        record = {column: value if value is not None else '' for column, value in zip(IMG_DATA_COLUMNS, img_data)}
+        record['file_name'] = os.path.basename(rel_name)
+        return record
+
+    def process_keywords(self, record: dict) -> dict:
+        """tidy up the record: no extra spaces and no duplicated keywords"""
+        new_record = dict(record)
+        for column in ('isolation', 'title', 'description'):
+            new_record[column] = collapse_spaces(record.get(column, ''))
+        lines = self.normalizer.dedup_fields([record.get(column, '') for column in KEYWORD_COLUMNS])
+        new_record.update(zip(KEYWORD_COLUMNS, lines))
+        return new_record
+
+    def __thumbnail(self, rel_name: str) -> tuple:
+        """(thumbnail, fingerprint) of the image, the thumbnail is made if DB doesn't have it yet"""
+        fingerprint = self.files.fingerprint(rel_name)
+        # the image with the same content may already have a thumbnail
+        thumbnail = None
+        if fingerprint is not None:
+            thumbnail = self.db.get_thumbnail_by_fingerprint(fingerprint)
+        if thumbnail is None:
+            thumbnail = self.thumbnailer(self.files.path(rel_name))
+        return thumbnail, fingerprint
+
+    def other_images(self, rel_names: list) -> list:
+        """file names of the images whose data would replace the data of the other image in DB:
+        other image with the same name, or the same image with the pixels edited"""
+        return self.db.other_images([(os.path.basename(rel_name), self.files.fingerprint(rel_name))
+                                     for rel_name in rel_names])
+
+    def save_record(self, rel_name: str, record: dict, replace: bool = False) -> int:
+        """write the image data to DB, return 1 if it is written and 0 if not
+
+        the thumbnail is made if DB doesn't have it yet, replace is as in KeywDB.insert_images_data()"""
+        thumbnail, fingerprint = self.__thumbnail(rel_name)
+        return self.db.insert_image_data(thumbnail, os.path.basename(rel_name),
+                                         *[record.get(column, '') for column in IMG_DATA_COLUMNS[1:]],
+                                         fingerprint=fingerprint, replace=replace)
+
+    def batch_records(self, rel_names: list, record: dict, own_record_for: str = '') -> list:
+        """list of (rel_name, record) to save the same data for all the images
+
+        The images keep their own title and description if they have them in DB,
+        except the own_record_for one: the record is made from its data."""
+        records = []
+        for rel_name in rel_names:
+            the_record = dict(record)
+            if rel_name != own_record_for:
+                old_record = self.load_record(rel_name)
+                if old_record is not None:
+                    for column in ('title', 'description'):
+                        if len(old_record[column]) > 0:
+                            the_record[column] = old_record[column]
+            records.append((rel_name, the_record))
+        return records
+
+    def save_records(self, records: list, replace: bool = False) -> int:
+        """write the list of (rel_name, record) to DB in one transaction, return the number of images written
+
+        the thumbnails are made in parallel, replace is as in KeywDB.insert_images_data()"""
+        with concurrent.futures.ThreadPoolExecutor(THUMBNAIL_WORKERS,
+                                                   thread_name_prefix='keyw_thumbnail') as executor:
+            thumbnails = list(executor.map(self.__thumbnail, [rel_name for rel_name, _ in records]))
+        rows = [((thumbnail, os.path.basename(rel_name)) +
+                 tuple(record.get(column, '') for column in IMG_DATA_COLUMNS[1:]), fingerprint)
+                for (rel_name, record), (thumbnail, fingerprint) in zip(records, thumbnails)]
+        return self.db.insert_images_data(rows, replace)
+
+    def similar_images(self, rel_name: str, k: int = 20) -> list:
+        """list of (distance, file_name) of the images in DB which look like the image"""
+        fingerprint = self.files.fingerprint(rel_name)
+        thumbnail = None
+        if fingerprint is not None:
+            thumbnail = self.db.get_thumbnail_by_fingerprint(fingerprint)
+        if thumbnail is None:
+            thumbnail = self.thumbnailer(self.files.path(rel_name))
+        the_name = os.path.basename(rel_name)
+        return [x for x in self.similar.similar_to(thumbnail, k + 1) if x[1] != the_name][:k]
+
+    def search(self, search_str: str, cancelled=None) -> list:
+        """list of the file names of the images which have all the words
+
+        the search stops and returns an empty list as soon as cancelled() is True"""
+        search_str = collapse_spaces(search_str)
+        if len(search_str) == 0:
+            return []
+        result = self.db.get_search_data(search_str, cancelled)
+        return result if result is not None else []
+
+    def search_async(self, search_str: str, callback) -> concurrent.futures.Future:
+        """search in the worker thread and call callback(results) from there
+
+        The new search or cancel_search() interrupts the previous one,
+        and its callback is not called."""
+        if self.__search_executor is None:
+            self.__search_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                           thread_name_prefix='keyw_search')
+        self.__search_generation += 1
+        generation = self.__search_generation
+
+        def cancelled() -> bool:
+            return generation != self.__search_generation
+
+        def do_search():
+            # the search may be superseded while it waits for the worker
+            if cancelled():
+                return
+            results = self.search(search_str, cancelled)
+            if not cancelled():
+                callback(results)
+
+        return self.__search_executor.submit(do_search)
+
+    def cancel_search(self):
+        """forget the search which is being made"""
+        self.__search_generation += 1
+
+    def merged_keywords(self, file_names: list) -> dict:
+        """keywords of the images merged together, without duplicates"""
+        return dict(zip(IMG_DATA_COLUMNS, self.db.get_imgs_metadata(file_names)))
@@ -1,19 +1,166 @@
 """database management for keyw application"""
 
-__version__ = '15.01.2023'
+__version__ = '19.10.2026'
 __author__ = 'Serhiy Kobyakov'
 __license__ = "MIT"
 
 
+import collections
 import os
+import pathlib
 import sqlite3
+import threading
+
+from keyw_keywords import get_default_normalizer
+from keyw_perf import timed
+
+
+# Img_data view columns
+IMG_DATA_COLUMNS = ('file_name', 'isolation', 'models', 'property', 'title', 'description',
+                    'concept', 'news', 'action', 'emotions', 'model_spec', 'objects',
+                    'image_spec', 'location', 'composition', 'wwwww', 'the_rest')
+# the keywords columns in the order of precedence
+KEYWORD_COLUMNS = IMG_DATA_COLUMNS[6:]
+# the columns the search looks in
+SEARCH_COLUMNS = IMG_DATA_COLUMNS[1:]
+SEARCH_LIMIT = 100
+# Images columns
+IMAGES_COLUMNS = ('thumbnail',) + IMG_DATA_COLUMNS + ('fingerprint', 'dhash')
+
+IMAGES_TABLE_SQL = """CREATE TABLE {schema}.Images (
+                      thumbnail BLOB NOT NULL,
+                      file_name TEXT PRIMARY KEY,
+                      isolation TEXT,
+                      models TEXT,
+                      property TEXT,
+                      title TEXT,
+                      description TEXT,
+                      concept TEXT,
+                      news TEXT,
+                      action TEXT,
+                      emotions TEXT,
+                      model_spec TEXT,
+                      objects TEXT,
+                      image_spec TEXT,
+                      location TEXT,
+                      composition TEXT,
+                      wwwww TEXT,
+                      the_rest TEXT,
+                      fingerprint TEXT,
+                      dhash INTEGER
+                      ) WITHOUT ROWID"""
+IMAGES_INDEX_SQL = """CREATE INDEX {schema}.Images_fingerprint ON Images (fingerprint)"""
+
+# the shard of the images of the year: my_metadata.<year>.sqlite3
+SHARD_FILE_PREFIX = 'my_metadata.'
+SHARD_FILE_SUFFIX = '.sqlite3'
+# sqlite attaches up to 10 DBs to the connection, so that many shards there may be
+MAX_SHARDS = 10
+
+
+def search_query(search_str: str, columns: str = 'thumbnail, file_name', limit: int = SEARCH_LIMIT) -> tuple:
+    """(sql, parameters) of the search for the images which have all the words"""
+    search_list = []
+    params = []
+    for word in search_str.split(' '):
+        search_list.append('(' + ' or '.join(f"{column} LIKE ?" for column in SEARCH_COLUMNS) + ')')
+        params.extend([f'%{word}%'] * len(SEARCH_COLUMNS))
+    sql = f"SELECT {columns} FROM Images WHERE (" + " and ".join(search_list) + f") LIMIT {int(limit)}"
+    return sql, params
+
+
+def shard_of(file_name: str) -> str:
+    """the year the image was taken, from its name like 2022-11-11_11-11-11_0000.jpg, or ''"""
+    if len(file_name) > 4 and file_name[:4].isdigit() and file_name[4] == '-':
+        return file_name[:4]
+    return ''
+
+
+def search_key(search_str: str) -> tuple:
+    """the searches with the same words give the same results: the order doesn't matter,
+    and LIKE ignores the case of ASCII letters only"""
+    return tuple(sorted({word.lower() if word.isascii() else word for word in search_str.split()}))
+
+
+class SearchCache:
+    """the last search results, forgotten as soon as anybody writes to DB
+
+    Only the file names are kept, the thumbnails are read when the results are shown.
+
+    The writes are seen with PRAGMA data_version of the connection kept open for that:
+    the value changes when other connection, in this or other process, commits.
+    Every shard has its own data version."""
+    def __init__(self, keyw_db, size: int = 64):
+        self.keyw_db = keyw_db
+        self.size = size
+        self.__lock = threading.Lock()
+        self.__results = collections.OrderedDict()
+        self.__conn = None
+        self.__shards = None
+        self.__data_version = None
+        self.hits = 0
+        self.misses = 0
+
+    def __check_data_version(self):
+        shards = self.keyw_db.shards()
+        if self.__conn is None or shards != self.__shards:
+            # the new shard has been made
+            if self.__conn is not None:
+                self.__conn.close()
+            self.__conn = self.keyw_db.create_db_conn(self.keyw_db.THE_DB_FILE, check_same_thread=False)
+            self.__shards = shards
+        data_version = tuple(self.__conn.execute(f"""PRAGMA {schema}.data_version""").fetchone()[0]
+                             for schema in ('main',) + tuple(KeywDB.shard_schema(shard) for shard in shards))
+        if data_version != self.__data_version:
+            self.__results.clear()
+            self.__data_version = data_version
+
+    def get(self, key: tuple) -> tuple:
+        """(the cached results or None, DB data version: the tuple of data_version of main and every shard)"""
+        with self.__lock:
+            self.__check_data_version()
+            result = self.__results.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.__results.move_to_end(key)
+            return (list(result) if result is not None else None), self.__data_version
+
+    def put(self, key: tuple, result: list, data_version: tuple):
+        """keep the results found with DB of data_version, unless DB has been changed since then
+
+        data_version is the tuple of data_version of main and every shard, as get() gives it"""
+        with self.__lock:
+            self.__check_data_version()
+            if data_version != self.__data_version:
+                return
+            self.__results[key] = tuple(result)
+            if len(self.__results) > self.size:
+                self.__results.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__results.clear()
 
 
 class KeywDB:
-    """Class for the keyw database management"""
+    """Class for the keyw database management
+
+    The images may be kept in the shards, one DB file per year, next to the main DB.
+    The shards are attached to every connection, and the temporary views Images and Img_data
+    over all of them hide the main DB ones, so the queries see one catalog.
+    The writes go to the shard of the image year."""
     THE_DB_FILE = 'my_metadata.sqlite3'
 
-    def __init__(self, db_dir: str):
+    def __init__(self, db_dir: str, check: bool = True, search_cache_size: int = 64, sharding: bool = False):
+        # callbacks hook(old_data, new_data) called after the image data is inserted
+        self.insert_hooks = []
+        # held while the images data is written and the insert hooks are called
+        self.write_lock = threading.RLock()
+        # the DB check may be postponed, it is done anyway before the first insert
+        self.checked = False
+
         if not os.path.isdir(db_dir):
             print(f"Error: the directory {db_dir} does not exists or it is not a directory!")
             print("  Please edit the keyw.ini properly:")
@@ -21,6 +168,13 @@ class KeywDB:
             exit(1)
 
         self.THE_DB_FILE = os.path.join(db_dir, self.THE_DB_FILE)
+        self.db_dir = db_dir
+        # the new images go to the shards of their year
+        self.sharding = sharding
+        self.__shards = self.__find_shards()
+        # the years which don't get the shard because there are MAX_SHARDS already
+        self.__unsharded = set()
+        self.search_cache = SearchCache(self, search_cache_size) if search_cache_size > 0 else None
 
         # check for DB file
         if not os.path.exists(self.THE_DB_FILE):
@@ -29,7 +183,7 @@ class KeywDB:
                 pass
             print("keyw DB: file created")
 
-            conn = self.create_db_conn(self.THE_DB_FILE)
+            conn = self.create_db_conn(self.THE_DB_FILE, attach_shards=False)
             if conn is not None:
                 c = conn.cursor()
                 # create tables
@@ -42,26 +196,8 @@ class KeywDB:
                              property TEXT PRIMARY KEY,
                              owner_full_name TEXT
                              ) WITHOUT ROWID""")
-                c.execute("""CREATE TABLE Images (
-                             thumbnail BLOB NOT NULL,
-                             file_name TEXT PRIMARY KEY,
-                             isolation TEXT,
-                             models TEXT,
-                             property TEXT,
-                             title TEXT,
-                             description TEXT,
-                             concept TEXT,
-                             news TEXT,
-                             action TEXT,
-                             emotions TEXT,
-                             model_spec TEXT,
-                             objects TEXT,
-                             image_spec TEXT,
-                             location TEXT,
-                             composition TEXT,
-                             wwwww TEXT,
-                             the_rest TEXT
-                             ) WITHOUT ROWID""")
+                c.execute(IMAGES_TABLE_SQL.format(schema='main'))
+                c.execute(IMAGES_INDEX_SQL.format(schema='main'))
                 c.execute("""CREATE VIEW Img_data AS SELECT
                              file_name,
                              isolation,
@@ -87,65 +223,344 @@ class KeywDB:
                 print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
                 exit(1)
 
-        # check DB before work
-        conn = self.create_db_conn(self.THE_DB_FILE)
+        if check:
+            self.check_db()
+
+    def check_db(self):
+        """check DB before work"""
+        conn = self.create_db_conn(self.THE_DB_FILE, attach_shards=False)
         if conn is not None:
             # check tables
             c = conn.cursor()
-            c.execute(""" SELECT count(name) FROM sqlite_master WHERE type='table' AND name='Models' """)
-            if not c.fetchone()[0] == 1:
-                print(f'Error: Table "Models" does not exist in {self.THE_DB_FILE}!')
-                exit(1)
-            c.execute(""" SELECT count(name) FROM sqlite_master WHERE type='table' AND name='Property' """)
-            if not c.fetchone()[0] == 1:
-                print(f'Error: Table "Property" does not exist in {self.THE_DB_FILE}!')
-                exit(1)
-            c.execute(""" SELECT count(name) FROM sqlite_master WHERE type='table' AND name='Images' """)
-            if not c.fetchone()[0] == 1:
-                print(f'Error: Table "Images" does not exist in {self.THE_DB_FILE}!')
-                exit(1)
+            c.execute(""" SELECT name FROM sqlite_master WHERE type='table' AND name IN ('Models', 'Property', 'Images') """)
+            tables = {row[0] for row in c.fetchall()}
+            for table in ('Models', 'Property', 'Images'):
+                if table not in tables:
+                    print(f'Error: Table "{table}" does not exist in {self.THE_DB_FILE}!')
+                    exit(1)
+
+            # the DB created before the images got the content fingerprint
+            c.execute(""" SELECT count(name) FROM pragma_table_info('Images') WHERE name='fingerprint' """)
+            if c.fetchone()[0] == 0:
+                c.execute("""ALTER TABLE Images ADD COLUMN fingerprint TEXT""")
+                c.execute("""CREATE INDEX IF NOT EXISTS Images_fingerprint ON Images (fingerprint)""")
+                conn.commit()
+                print("keyw DB: fingerprint column added to Images")
+
+            # the DB created before the thumbnails got the perceptual hash
+            c.execute(""" SELECT count(name) FROM pragma_table_info('Images') WHERE name='dhash' """)
+            if c.fetchone()[0] == 0:
+                c.execute("""ALTER TABLE Images ADD COLUMN dhash INTEGER""")
+                conn.commit()
+                print("keyw DB: dhash column added to Images")
 
             # maybe some data checks?
 
             conn.close()
+            self.checked = True
         else:
             print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
             exit(1)
 
-    @staticmethod
-    def create_db_conn(db_file):
+    def read_only_conn(self) -> sqlite3.Connection:
+        """read-only connection, it may be used from any thread but by one at a time"""
+        uri = pathlib.Path(self.THE_DB_FILE).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.__attach_shards(conn, read_only=True)
+        return conn
+
+    def enable_wal(self) -> bool:
+        """switch DB and its shards to the write-ahead log, so the readers don't wait for the writer
+
+        The journal mode is kept in the DB file, so it is enough to do it once."""
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is None:
+            return False
+        try:
+            modes = [conn.execute(f"""PRAGMA {schema}.journal_mode=WAL""").fetchone()[0]
+                     for schema in ['main'] + [self.shard_schema(shard) for shard in self.__shards]]
+        except sqlite3.Error as error:
+            print("Error: can't switch DB to the WAL journal mode:")
+            print(f"  {error}")
+            return False
+        finally:
+            conn.close()
+        return all(mode == 'wal' for mode in modes)
+
+    def create_db_conn(self, db_file, attach_shards: bool = True, check_same_thread: bool = True):
+        """the connection to DB, with the shards attached to it if there are any"""
         conn = None
         try:
-            conn = sqlite3.connect(db_file)
+            conn = sqlite3.connect(db_file, check_same_thread=check_same_thread)
+            if attach_shards and db_file == self.THE_DB_FILE:
+                self.__attach_shards(conn)
             return conn
         except Exception as e:
             print(e)
         return conn
 
-    def insert_image_data(self, *args):
-        """insert image data into DB"""
-        n_args_expected = 18
-        if not len(args) == n_args_expected:
-            print(f"Error: number of insert_image() arguments is {len(args)} instead of {n_args_expected}!")
+    @staticmethod
+    def shard_schema(shard: str) -> str:
+        """the name the shard is attached with"""
+        return f"shard_{shard}"
+
+    def shard_file(self, shard: str) -> str:
+        return os.path.join(self.db_dir, SHARD_FILE_PREFIX + shard + SHARD_FILE_SUFFIX)
+
+    def shards(self) -> tuple:
+        """the shards DB has, the years
+
+        the directory is read every time: the shard may be made by other keyw process"""
+        self.__shards = self.__find_shards()
+        return tuple(self.__shards)
+
+    def db_files(self) -> list:
+        """the main DB file and the shard files"""
+        return [self.THE_DB_FILE] + [self.shard_file(shard) for shard in self.__shards]
+
+    def __find_shards(self) -> list:
+        shards = []
+        with os.scandir(self.db_dir) as it:
+            for entry in it:
+                if entry.name.startswith(SHARD_FILE_PREFIX) and entry.name.endswith(SHARD_FILE_SUFFIX):
+                    shard = entry.name[len(SHARD_FILE_PREFIX):-len(SHARD_FILE_SUFFIX)]
+                    if len(shard) == 4 and shard.isdigit():
+                        shards.append(shard)
+        return sorted(shards)
+
+    def __attach_shards(self, conn: sqlite3.Connection, read_only: bool = False):
+        """attach the shards and hide the main DB Images and Img_data with the views over all of them
+
+        sqlite attaches up to MAX_SHARDS DBs, the connection without some of them would miss their images"""
+        shards = self.shards()
+        if len(shards) == 0:
+            return
+        if len(shards) > MAX_SHARDS:
+            print(f"Error: there are {len(shards)} DB shards in {self.db_dir}, sqlite attaches {MAX_SHARDS} at most!")
+            print(f"  Please move the images of the extra years back to {self.THE_DB_FILE}")
+            exit(1)
+        schemas = ['main']
+        for shard in shards:
+            shard_file = self.shard_file(shard)
+            if read_only:
+                shard_file = pathlib.Path(shard_file).resolve().as_uri() + '?mode=ro'
+            try:
+                conn.execute("""ATTACH DATABASE ? AS ?""", (shard_file, self.shard_schema(shard)))
+            except sqlite3.Error as error:
+                conn.close()
+                print(f"Error: can't attach the DB shard {shard_file}:")
+                print(f"  {error}")
+                exit(1)
+            schemas.append(self.shard_schema(shard))
+        columns = ', '.join(IMAGES_COLUMNS)
+        conn.execute("""CREATE TEMP VIEW Images AS """ +
+                     """ UNION ALL """.join(f"""SELECT {columns} FROM {schema}.Images""" for schema in schemas))
+        conn.execute(f"""CREATE TEMP VIEW Img_data AS SELECT {', '.join(IMG_DATA_COLUMNS)} FROM temp.Images""")
+
+    def schema_for(self, file_name: str) -> str:
+        """where the image data is written: main or the shard of the image year"""
+        shard = shard_of(file_name)
+        if shard in self.__shards or (len(shard) > 0 and self.sharding and shard not in self.__unsharded):
+            return self.shard_schema(shard)
+        return 'main'
+
+    def __make_shards(self, file_names):
+        """make the shard files the images go to if there are no such yet
+
+        the years past MAX_SHARDS stay in the main DB"""
+        if not self.sharding:
+            return
+        shards = self.shards()
+        new_shards = set()
+        for file_name in file_names:
+            shard = shard_of(file_name)
+            if len(shard) > 0 and shard not in shards and shard not in self.__unsharded:
+                new_shards.add(shard)
+        room = MAX_SHARDS - len(shards)
+        if len(new_shards) > room:
+            # the later years are more likely to get new images
+            new_shards = sorted(new_shards, reverse=True)
+            self.__unsharded.update(new_shards[max(room, 0):])
+            print(f"Note: sqlite attaches {MAX_SHARDS} DB shards at most, the images of "
+                  f"{', '.join(sorted(new_shards[max(room, 0):]))} stay in the main DB")
+            new_shards = set(new_shards[:max(room, 0)])
+        if len(new_shards) == 0:
+            return
+        conn = self.create_db_conn(self.THE_DB_FILE, attach_shards=False)
+        # the shards are in the same journal mode as the main DB
+        journal_mode = conn.execute("""PRAGMA journal_mode""").fetchone()[0]
+        conn.close()
+        for shard in sorted(new_shards):
+            conn = sqlite3.connect(self.shard_file(shard))
+            try:
+                conn.execute(IMAGES_TABLE_SQL.format(schema='main'))
+                conn.execute(IMAGES_INDEX_SQL.format(schema='main'))
+                conn.commit()
+                if journal_mode == 'wal':
+                    conn.execute("""PRAGMA journal_mode=WAL""")
+            except sqlite3.Error as error:
+                print(f"Error: can't create the DB shard {self.shard_file(shard)}:")
+                print(f"  {error}")
+                exit(1)
+            finally:
+                conn.close()
+            print(f"keyw DB: shard {self.shard_file(shard)} created")
+        self.__shards = sorted(set(self.__shards) | new_shards)
+
+    def migrate_to_shards(self) -> dict:
+        """move the images from the main DB to the shards of their years, return shard -> number of images
+
+        sqlite doesn't commit the attached DBs atomically in the WAL mode, so the images are
+        copied to the shard first, and only the ones found there the same are deleted from main.
+        If it is interrupted, the image may be in both for a while: run it again to finish."""
+        conn = self.create_db_conn(self.THE_DB_FILE, attach_shards=False)
+        names = [row[0] for row in conn.execute("""SELECT file_name FROM main.Images""")]
+        conn.close()
+        sharding, self.sharding = self.sharding, True
+        try:
+            self.__make_shards(names)
+        finally:
+            self.sharding = sharding
+        moved = {}
+        columns = ', '.join(IMAGES_COLUMNS)
+        same_row = ' AND '.join(f"""s.{column} IS m.{column}""" for column in IMAGES_COLUMNS)
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        try:
+            conn.execute("""CREATE TEMP TABLE Moved_images (file_name TEXT PRIMARY KEY, shard TEXT)""")
+            conn.executemany("""INSERT INTO temp.Moved_images VALUES (?, ?)""",
+                             [(name, shard_of(name)) for name in names if shard_of(name) in self.__shards])
+            conn.commit()
+            for shard in self.__shards:
+                schema = self.shard_schema(shard)
+                # copy
+                conn.execute(f"""INSERT OR REPLACE INTO {schema}.Images ({columns})
+                             SELECT {columns} FROM main.Images WHERE file_name IN
+                             (SELECT file_name FROM temp.Moved_images WHERE shard=?)""", (shard,))
+                conn.commit()
+                # verify and delete
+                c = conn.execute(f"""DELETE FROM main.Images WHERE file_name IN
+                                 (SELECT m.file_name FROM main.Images AS m JOIN {schema}.Images AS s
+                                 ON s.file_name = m.file_name WHERE {same_row})""")
+                conn.commit()
+                moved[shard] = c.rowcount
+        except sqlite3.Error as error:
+            conn.rollback()
+            print("Error: can't move the images to the DB shards:")
+            print(f"  {error}")
+            print("  The images already copied are in both the main DB and the shard, run it again to finish")
             exit(1)
+        finally:
+            conn.close()
+        return moved
+
+    def insert_image_data(self, *args, fingerprint: str = None, replace: bool = False) -> int:
+        """insert image data into DB, return 1 if it is written and 0 if not
+
+        the arguments go in the Images columns order: thumbnail, file_name, isolation, ..., the_rest"""
+        return self.insert_images_data([(args, fingerprint)], replace)
+
+    @timed('db insert')
+    def insert_images_data(self, rows: list, replace: bool = False) -> int:
+        """insert many images data into DB in one transaction, return the number of images written
+
+        rows is the list of (args, fingerprint), args go as in insert_image_data().
+        The image is not written if DB has other image with the same file name and other fingerprint,
+        unless replace is True: the image may be the same one with the pixels edited, see other_images()."""
+        n_args_expected = 18
+        for args, _ in rows:
+            if not len(args) == n_args_expected:
+                print(f"Error: number of insert_image() arguments is {len(args)} instead of {n_args_expected}!")
+                exit(1)
+        if len(rows) == 0:
+            return 0
+        if not self.checked:
+            self.check_db()
+        self.__make_shards([args[1] for args, _ in rows])
+        # the readers in the other threads of this process see the data written together with the hooks done
+        with self.write_lock:
+            return self.__write_images_data(rows, replace)
+
+    def __write_images_data(self, rows: list, replace: bool) -> int:
+        # (args, the old Img_data row) of the images written
+        saved = []
+        inserted = False
         conn = self.create_db_conn(self.THE_DB_FILE)
         if conn is not None:
             try:
                 c = conn.cursor()
                 insert_query = """INSERT OR REPLACE 
-                INTO Images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
-                c.execute(insert_query, args)
+                INTO {schema}.Images (thumbnail, file_name, isolation, models, property, title, description,
+                concept, news, action, emotions, model_spec, objects, image_spec, location, composition,
+                wwwww, the_rest, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+                for args, fingerprint in rows:
+                    if fingerprint is not None and not replace:
+                        # the file name is the key: other image with the same name would be replaced
+                        c.execute("""SELECT fingerprint FROM Images WHERE file_name=? AND fingerprint IS NOT NULL
+                                  AND fingerprint != ?""", (args[1], fingerprint))
+                        if c.fetchone() is not None:
+                            print(f"Error: DB already has other image named {args[1]}, its data is not replaced!")
+                            print("  Please rename the image, or save it with the replace if it is the edited one")
+                            continue
+                    old_row = None
+                    if len(self.insert_hooks) > 0:
+                        c.execute("""SELECT * FROM Img_data WHERE file_name=?""", (args[1],))
+                        old_row = c.fetchone()
+                    schema = self.schema_for(args[1])
+                    c.execute(insert_query.format(schema=schema), args + (fingerprint,))
+                    if schema != 'main':
+                        # the image saved before the DB was sharded
+                        c.execute("""DELETE FROM main.Images WHERE file_name=?""", (args[1],))
+                    saved.append((args, old_row))
                 conn.commit()
+                inserted = len(saved) > 0
+            except sqlite3.Error as error:
+                conn.rollback()
+                the_images = rows[0][0][1] if len(rows) == 1 else f"{len(rows)} images"
+                print(f"Error: can't insert the {the_images} image data to DB:")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        if inserted:
+            if len(saved) == 1:
+                print(f"image {saved[0][0][1]} data has been inserted into DB successfully")
+            else:
+                print(f"{len(saved)} images data have been inserted into DB successfully")
+            for args, old_row in saved:
+                for hook in self.insert_hooks:
+                    hook(old_row, args[1:])
+        return len(saved) if inserted else 0
+
+    def other_images(self, rows: list) -> list:
+        """file names of the list of (file_name, fingerprint) which DB has the data of the image
+        with other content for, or which are in the list twice with the different fingerprints"""
+        result = []
+        fingerprints = {}
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                for file_name, fingerprint in rows:
+                    if fingerprint is None:
+                        continue
+                    if fingerprints.setdefault(file_name, fingerprint) != fingerprint:
+                        result.append(file_name)
+                        continue
+                    c.execute("""SELECT fingerprint FROM Images WHERE file_name=? AND fingerprint IS NOT NULL
+                              AND fingerprint != ?""", (file_name, fingerprint))
+                    if c.fetchone() is not None:
+                        result.append(file_name)
             except sqlite3.Error as error:
-                print(f"Error: can't insert the {args[1]} image data to DB:")
+                print("Error: problem with getting the images fingerprints from DB")
                 print(f"  {error}")
             finally:
-                if c.rowcount > 0:
-                    print(f"image {args[1]} data has been inserted into DB successfully")
                 conn.close()
         else:
             print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
             exit(1)
+        return list(dict.fromkeys(result))
 
     def data_exists(self, the_image: str):
         """check if data for the image the_image exists in DB"""
@@ -191,79 +606,203 @@ class KeywDB:
             exit(1)
         return result
 
+    @timed('db lookup')
+    def find_img_metadata(self, the_image: str, fingerprint: str = None):
+        """get image data by the file name and the content fingerprint
+
+        The image with the same content wins over the image with the same name,
+        so the renamed or copied image gets its data back
+        while other image with the same name in another directory doesn't."""
+        if fingerprint is None:
+            return self.get_img_metadata(the_image)
+        found_name = None
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                c.execute("""SELECT file_name, fingerprint FROM Images WHERE fingerprint=? OR file_name=?""",
+                          (fingerprint, the_image))
+                best_rank = 0
+                for file_name, the_fingerprint in c.fetchall():
+                    if the_fingerprint == fingerprint:
+                        rank = 3 if file_name == the_image else 2
+                    elif the_fingerprint is None:
+                        # the data saved before the fingerprints were introduced
+                        rank = 1
+                    else:
+                        # other image with the same name
+                        rank = 0
+                    if rank > best_rank:
+                        best_rank = rank
+                        found_name = file_name
+            except sqlite3.Error as error:
+                print(f"Error: problem with getting image {the_image} data from DB")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        if found_name is None:
+            return None
+        return self.get_img_metadata(found_name)
+
+    def get_thumbnail_by_fingerprint(self, fingerprint: str):
+        """get the thumbnail of the image with the same content or None"""
+        result = None
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                c.execute("""SELECT thumbnail FROM Images WHERE fingerprint=? LIMIT 1""", (fingerprint,))
+                row = c.fetchone()
+                if row is not None:
+                    result = row[0]
+            except sqlite3.Error as error:
+                print(f"Error: problem with getting thumbnail for {fingerprint} from DB")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        return result
+
+    def get_thumbnails(self, images: list) -> list:
+        """list of (thumbnail, file_name) of the images in the same order, the missing ones are skipped"""
+        result = []
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                for the_image in images:
+                    c.execute("""SELECT thumbnail, file_name FROM Images WHERE file_name=?""", (the_image,))
+                    row = c.fetchone()
+                    if row is not None:
+                        result.append(row)
+            except sqlite3.Error as error:
+                print("Error: problem with getting thumbnails from DB")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        return result
+
+    def get_thumbnails_without_dhash(self, limit: int = 1000) -> list:
+        """list of (file_name, thumbnail) of the images which don't have the perceptual hash yet"""
+        if not self.checked:
+            self.check_db()
+        result = []
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                c.execute("""SELECT file_name, thumbnail FROM Images WHERE dhash IS NULL LIMIT ?""", (limit,))
+                result = c.fetchall()
+            except sqlite3.Error as error:
+                print("Error: problem with getting thumbnails from DB")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        return result
+
+    def set_dhashes(self, dhashes: list) -> int:
+        """write the list of (dhash, file_name) to DB in one transaction, return the number of rows updated
+
+        The image may be still in main though its year has the shard already, so every schema is updated."""
+        n_updated = 0
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                with conn:
+                    for schema in ['main'] + [self.shard_schema(shard) for shard in self.__shards]:
+                        n_updated += conn.executemany(f"""UPDATE {schema}.Images SET dhash=? WHERE file_name=?""",
+                                                      dhashes).rowcount
+            except sqlite3.Error as error:
+                n_updated = 0
+                print("Error: can't write the perceptual hashes to DB:")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        return n_updated
+
+    def get_dhashes(self) -> list:
+        """list of (file_name, dhash) of all the images which have the perceptual hash"""
+        result = []
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                c.execute("""SELECT file_name, dhash FROM Images WHERE dhash IS NOT NULL""")
+                result = c.fetchall()
+            except sqlite3.Error as error:
+                print("Error: problem with getting the perceptual hashes from DB")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        return result
+
     def get_imgs_metadata(self, images: list):
-        """get image the_image data"""
-        results = None
+        """get the images keywords data merged together, without duplicates"""
+        rows = []
         conn = self.create_db_conn(self.THE_DB_FILE)
         if conn is not None:
             c = conn.cursor()
-            q_result = ''
             for the_image in images:
                 try:
-                    c = conn.cursor()
-                    query = f"""SELECT * FROM Img_data WHERE file_name='{the_image}'"""
-                    c.execute(query)
+                    c.execute("""SELECT * FROM Img_data WHERE file_name=?""", (the_image,))
                     q_result = c.fetchone()
+                    if q_result is not None:
+                        rows.append(q_result)
                 except sqlite3.Error as error:
                     print(f"Error: problem with getting image {the_image} data from DB")
                     print(f"  {error}")
-                finally:
-                    if len(q_result) > 0:
-                        if results is None:
-                            results = q_result
-                        else:
-                            results = [f'{results} {result}' for results, result in zip(results, q_result)]
             conn.close()
-
-            # remove duplicates
-            new_results = []
-            counter = 0
-            for line in results:
-                if counter > 5:
-                    tmp_str = line.replace('  ', ' ').replace('  ', ' ').strip()
-                    new_results.append(' '.join(list(dict.fromkeys(tmp_str.split(' ')))))
-                else:
-                    new_results.append('')
-                counter += 1
-                # print(counter, new_results[-1])
-
         else:
             print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
             exit(1)
-        return new_results
 
-    def get_search_data(self, search_str: str):
-        """get list of images which have keywords"""
+        # only the keywords are merged
+        normalizer = get_default_normalizer()
+        return ['' if i < 6 else normalizer.merge_lines(row[i] for row in rows)
+                for i in range(len(IMG_DATA_COLUMNS))]
+
+    @timed('db search')
+    def get_search_data(self, search_str: str, cancelled=None):
+        """get list of the file names of the images which have keywords
+
+        the search is interrupted and None is returned as soon as cancelled() is True"""
+        key = search_key(search_str)
+        if self.search_cache is not None:
+            result, data_version = self.search_cache.get(key)
+            if result is not None:
+                return result
         conn = self.create_db_conn(self.THE_DB_FILE)
         result = None
         if conn is not None:
             try:
+                if cancelled is not None:
+                    # sqlite calls it every 1000 virtual machine instructions, nonzero stops the query
+                    conn.set_progress_handler(cancelled, 1000)
                 c = conn.cursor()
-                search_list = []
-                for word in search_str.split(' '):
-                    search_list.append(f"""(isolation LIKE '%{word}%' or
-                    models LIKE '%{word}%' or
-                    property LIKE '%{word}%' or
-                    title LIKE '%{word}%' or
-                    description LIKE '%{word}%' or
-                    concept LIKE '%{word}%' or
-                    news LIKE '%{word}%' or
-                    action LIKE '%{word}%' or
-                    emotions LIKE '%{word}%' or
-                    model_spec LIKE '%{word}%' or
-                    objects LIKE '%{word}%' or
-                    image_spec LIKE '%{word}%' or
-                    location LIKE '%{word}%' or
-                    composition LIKE '%{word}%' or
-                    wwwww LIKE '%{word}%' or
-                    the_rest LIKE '%{word}%')""")
-                insert_query = "SELECT thumbnail, file_name FROM Images WHERE (" +\
-                               """ and """.join(search_list) + """) LIMIT 100"""
-                # print(insert_query)
-                c.execute(insert_query)
-                result = c.fetchall()
-                if not isinstance(result, list):
-                    print("Error getting search results from DB (c.fetchall())!")
+                c.execute(*search_query(search_str, 'file_name'))
+                result = [row[0] for row in c.fetchall()]
+            except sqlite3.OperationalError as error:
+                result = None
+                if cancelled is None or not cancelled():
+                    print("Error: problem with DB:")
+                    print(f"  {error}")
             except sqlite3.Error as error:
                 print("Error: problem with DB:")
                 print(f"  {error}")
@@ -273,4 +812,88 @@ class KeywDB:
         else:
             print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
             exit(1)
+        if self.search_cache is not None and isinstance(result, list):
+            self.search_cache.put(key, result, data_version)
         return result
+
+    def iter_thumbnails(self, chunk_size: int = 100):
+        """generator of (file_name, thumbnail) of all the images"""
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                c.execute("""SELECT file_name, thumbnail FROM Images ORDER BY file_name""")
+                while True:
+                    rows = c.fetchmany(chunk_size)
+                    if len(rows) == 0:
+                        break
+                    yield from rows
+            except sqlite3.Error as error:
+                print("Error: problem with reading thumbnails from DB:")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+
+    def get_images_data_chunk(self, after: str, columns: tuple = IMG_DATA_COLUMNS, chunk_size: int = 1000,
+                              on_read=None) -> list:
+        """the data rows of the next chunk_size images in the file name order, after the file name after
+
+        columns must start with file_name. Every chunk is read by its own short query, so the writer
+        doesn't wait for the one who reads them all. on_read(rows) is called before this process
+        writes to DB again: the rows and the insert hooks called till then tell the same."""
+        if columns[0] != 'file_name':
+            print("Error: the chunk of the images data must start with file_name!")
+            exit(1)
+        for column in columns:
+            if column not in IMG_DATA_COLUMNS:
+                print(f"Error: there is no column {column} in Img_data!")
+                exit(1)
+        rows = []
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                with self.write_lock:
+                    rows = conn.execute(f"""SELECT {', '.join(columns)} FROM Img_data WHERE file_name > ?
+                                        ORDER BY file_name LIMIT ?""", (after, chunk_size)).fetchall()
+                    if on_read is not None:
+                        on_read(rows)
+            except sqlite3.Error as error:
+                print("Error: problem with reading images data from DB:")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
+        return rows
+
+    def iter_images_data(self, columns: tuple = IMG_DATA_COLUMNS, chunk_size: int = 1000):
+        """generator of the images data rows (without thumbnails) for the export
+
+        The rows are fetched from the cursor by chunks of chunk_size,
+        so the memory usage doesn't depend on the number of images in DB."""
+        for column in columns:
+            if column not in IMG_DATA_COLUMNS:
+                print(f"Error: there is no column {column} in Img_data!")
+                exit(1)
+        conn = self.create_db_conn(self.THE_DB_FILE)
+        if conn is not None:
+            try:
+                c = conn.cursor()
+                c.execute(f"""SELECT {', '.join(columns)} FROM Img_data ORDER BY file_name""")
+                while True:
+                    rows = c.fetchmany(chunk_size)
+                    if len(rows) == 0:
+                        break
+                    yield from rows
+            except sqlite3.Error as error:
+                print("Error: problem with reading images data from DB:")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        else:
+            print(f"Error: can't create the {self.THE_DB_FILE} database connection!")
+            exit(1)
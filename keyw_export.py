@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+"""export of the keyw database for the stock agencies
+
+The agency profiles are kept in keyw.ini, one section per agency:
+
+[export:shutterstock]
+format = csv
+columns = file_name:Filename, description:Description, keywords:Keywords
+keyword_fields = concept, news, action, emotions, model_spec, objects, image_spec, location, composition, wwwww, the_rest
+keyword_separator = ,
+max_keywords = 50
+skip_untagged = yes
+
+usage: keyw_export.py <agency> <output file>"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import argparse
+import configparser
+import csv
+import itertools
+import json
+
+from keyw_db import IMG_DATA_COLUMNS
+from keyw_db import KEYWORD_COLUMNS
+from keyw_db import KeywDB
+from keyw_keywords import get_default_normalizer
+
+
+EXPORT_FORMATS = ('csv', 'json')
+
+DEFAULT_PROFILE = {
+    'format': 'csv',
+    'columns': 'file_name:Filename, title:Title, description:Description, keywords:Keywords',
+    'keyword_fields': ', '.join(KEYWORD_COLUMNS),
+    'keyword_separator': ', ',
+    'max_keywords': '0',
+    'skip_untagged': 'yes',
+}
+
+
+class ExportProfile:
+    """what and how to export for the stock agency"""
+    def __init__(self, name: str, options: dict):
+        self.name = name
+        options = DEFAULT_PROFILE | options
+        self.format = options['format'].strip().lower()
+        if self.format not in EXPORT_FORMATS:
+            print(f"Error: unknown export format {self.format} for {name}, use one of: {', '.join(EXPORT_FORMATS)}")
+            exit(1)
+        # list of (source, header) pairs
+        self.columns = []
+        for item in options['columns'].split(','):
+            source, _, header = item.strip().partition(':')
+            if source not in IMG_DATA_COLUMNS and source != 'keywords':
+                print(f"Error: unknown export column {source} for {name}!")
+                exit(1)
+            self.columns.append((source, header if len(header) > 0 else source))
+        self.keyword_fields = [x.strip() for x in options['keyword_fields'].split(',') if len(x.strip()) > 0]
+        for field in self.keyword_fields:
+            if field not in IMG_DATA_COLUMNS:
+                print(f"Error: unknown keywords field {field} for {name}!")
+                exit(1)
+        # configparser strips the values, so the separator may lose its space
+        self.keyword_separator = options['keyword_separator'] if len(options['keyword_separator']) > 0 else ' '
+        self.max_keywords = int(options['max_keywords'])
+        self.skip_untagged = options['skip_untagged'].strip().lower() in ('yes', 'true', 'on', '1')
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser, agency: str):
+        """profile for the agency from the [export:<agency>] section of keyw.ini"""
+        section = f'export:{agency}'
+        if config.has_section(section):
+            return cls(agency, dict(config.items(section)))
+        print(f"Note: there is no [{section}] section in keyw.ini, using the default profile")
+        return cls(agency, {})
+
+
+class CatalogExporter:
+    """streams the images data from DB to csv or json file"""
+    def __init__(self, keyw_db: KeywDB, profile: ExportProfile, chunk_size: int = 1000):
+        self.keyw_db = keyw_db
+        self.profile = profile
+        self.chunk_size = chunk_size
+        self.__index = {name: i for i, name in enumerate(IMG_DATA_COLUMNS)}
+
+    def keywords(self, img_data: tuple) -> list:
+        """flat list of keywords from the profile keywords fields, no duplicates"""
+        words = get_default_normalizer().merge_lines(img_data[self.__index[field]]
+                                                     for field in self.profile.keyword_fields).split()
+        if self.profile.max_keywords > 0:
+            words = words[:self.profile.max_keywords]
+        return words
+
+    def rows(self):
+        """generator of the output rows"""
+        for img_data in self.keyw_db.iter_images_data(chunk_size=self.chunk_size):
+            keywords = self.keywords(img_data)
+            if self.profile.skip_untagged and len(keywords) == 0:
+                continue
+            row = []
+            for source, _ in self.profile.columns:
+                if source == 'keywords':
+                    row.append(self.profile.keyword_separator.join(keywords))
+                else:
+                    value = img_data[self.__index[source]]
+                    row.append(value if value is not None else '')
+            yield row
+
+    def write(self, out_file) -> int:
+        """write all the rows to the text file object by chunks, return the number of rows"""
+        headers = [header for _, header in self.profile.columns]
+        rows = self.rows()
+        n_rows = 0
+        if self.profile.format == 'csv':
+            writer = csv.writer(out_file)
+            writer.writerow(headers)
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if len(chunk) == 0:
+                    break
+                writer.writerows(chunk)
+                n_rows += len(chunk)
+        else:
+            out_file.write('[')
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if len(chunk) == 0:
+                    break
+                out_file.write(',' if n_rows > 0 else '')
+                out_file.write(','.join('\n' + json.dumps(dict(zip(headers, row)), ensure_ascii=False)
+                                        for row in chunk))
+                n_rows += len(chunk)
+            out_file.write('\n]\n')
+        return n_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="export keyw database for the stock agency")
+    parser.add_argument('agency', help="agency name, the [export:<agency>] section of keyw.ini")
+    parser.add_argument('output', help="output file")
+    args = parser.parse_args()
+
+    from keyw_cli import main
+    main(['export', args.agency, args.output])
@@ -0,0 +1,246 @@
+"""jpeg files index for keyw application"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import hashlib
+import mmap
+import os
+import re
+
+from keyw_perf import timed
+
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+_NUMBERS = re.compile(r'(\d+)')
+
+
+def natural_key(the_str: str) -> list:
+    """key for the natural sort order: img_2.jpg goes before img_10.jpg"""
+    return [int(part) if part.isdigit() else part.casefold() for part in _NUMBERS.split(the_str)]
+
+
+def jpeg_fingerprint(f_name: str):
+    """returns hex digest of the jpeg scan data or None if the file can't be read
+
+    The metadata segments (EXIF, IPTC, XMP) go before the first SOS marker,
+    so the fingerprint stays the same when the metadata is written to the file
+    or when the file is renamed or copied."""
+    try:
+        with open(f_name, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < 4:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                start, end = _scan_data_bounds(m)
+                with memoryview(m) as the_view:
+                    return hashlib.blake2b(the_view[start:end], digest_size=16).hexdigest()
+    except (OSError, ValueError) as error:
+        print(f"Error: can't read the {f_name} file:")
+        print(f"  {error}")
+        return None
+
+
+def _scan_data_bounds(m) -> tuple:
+    """returns (start, end) of the jpeg scan data: from the first SOS marker to EOI
+
+    If the file doesn't look like a jpeg the whole file is used."""
+    n = len(m)
+    if m[0] != 0xFF or m[1] != 0xD8:
+        return 0, n
+    i = 2
+    while i + 3 < n:
+        if m[i] != 0xFF:
+            return 0, n
+        marker = m[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+        elif marker == 0xDA:
+            end = m.rfind(b'\xff\xd9')
+            return i, end + 2 if end > i else n
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # markers without length
+            i += 2
+        else:
+            i += 2 + (m[i + 2] << 8 | m[i + 3])
+    return 0, n
+
+
+class FileEntry:
+    """jpeg file found in the working directory"""
+    __slots__ = ('path', 'rel_path', 'name', 'size', 'mtime_ns', 'fingerprint')
+
+    def __init__(self, path: str, rel_path: str, the_stat: os.stat_result):
+        self.path = path
+        self.rel_path = rel_path
+        self.name = os.path.basename(path)
+        self.size = the_stat.st_size
+        self.mtime_ns = the_stat.st_mtime_ns
+        self.fingerprint = None
+
+
+class FileIndex:
+    """index of jpeg files in the working directory
+
+    The directory tree is read with os.scandir, the stat results are kept
+    and the contents of every directory is cached by its mtime,
+    so refresh() only re-reads the directories which have been changed."""
+
+    def __init__(self, root: str = '', recursive: bool = False):
+        self.root = ''
+        self.recursive = recursive
+        # dir path -> (dir mtime, list of FileEntry, list of subdirectories)
+        self.__dirs = {}
+        self.__files = []
+        self.__by_rel_path = {}
+        if len(root) > 0:
+            self.set_root(root)
+
+    def set_root(self, root: str) -> bool:
+        """set new working directory, return True if the list of files has been changed"""
+        root = os.path.realpath(os.path.expanduser(root))
+        if root != self.root:
+            self.root = root
+            self.__dirs = {}
+        return self.refresh()
+
+    def set_recursive(self, recursive: bool) -> bool:
+        """switch between recursive and flat listing"""
+        if recursive != self.recursive:
+            self.recursive = recursive
+            self.__dirs = {}
+        return self.refresh()
+
+    @timed('file listing')
+    def refresh(self) -> bool:
+        """re-read the changed directories, return True if the list of files has been changed"""
+        if len(self.root) == 0 or not os.path.isdir(self.root):
+            changed = len(self.__files) > 0
+            self.__dirs = {}
+            self.__files = []
+            self.__by_rel_path = {}
+            return changed
+
+        changed = False
+        visited = set()
+        files = []
+        stack = [self.root]
+        while len(stack) > 0:
+            the_dir = stack.pop()
+            visited.add(the_dir)
+            try:
+                dir_mtime = os.stat(the_dir).st_mtime_ns
+            except OSError:
+                changed = True
+                continue
+            cached = self.__dirs.get(the_dir)
+            if cached is None or cached[0] != dir_mtime:
+                cached = self.__scan_dir(the_dir, dir_mtime, cached[1] if cached is not None else [])
+                self.__dirs[the_dir] = cached
+                changed = True
+            files.extend(cached[1])
+            if self.recursive:
+                stack.extend(cached[2])
+
+        # forget the directories which have gone
+        for the_dir in [x for x in self.__dirs if x not in visited]:
+            del self.__dirs[the_dir]
+            changed = True
+
+        if changed:
+            files.sort(key=lambda x: natural_key(x.rel_path))
+            self.__files = files
+            self.__by_rel_path = {x.rel_path: x for x in files}
+            return True
+        return False
+
+    def __scan_dir(self, the_dir: str, dir_mtime: int, old_entries: list) -> tuple:
+        """read one directory, the files which have the same size and mtime keep their fingerprints"""
+        old_entries = {x.path: x for x in old_entries}
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(the_dir) as it:
+                for dir_entry in it:
+                    if dir_entry.name.startswith('.'):
+                        continue
+                    try:
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            subdirs.append(dir_entry.path)
+                        elif dir_entry.is_file() and dir_entry.name.lower().endswith(JPEG_EXTENSIONS):
+                            rel_path = os.path.relpath(dir_entry.path, self.root)
+                            the_entry = FileEntry(dir_entry.path, rel_path, dir_entry.stat())
+                            old_entry = old_entries.get(the_entry.path)
+                            if old_entry is not None and old_entry.size == the_entry.size \
+                                    and old_entry.mtime_ns == the_entry.mtime_ns:
+                                the_entry.fingerprint = old_entry.fingerprint
+                            entries.append(the_entry)
+                    except OSError:
+                        # the file has gone while we were reading the directory
+                        pass
+        except OSError as error:
+            print(f"Error: can't read the directory {the_dir}:")
+            print(f"  {error}")
+        return dir_mtime, entries, subdirs
+
+    @property
+    def files(self) -> list:
+        """list of FileEntry in natural sort order"""
+        return self.__files
+
+    def names(self, skip_duplicates: bool = False) -> list:
+        """list of file names relative to the working directory
+
+        with skip_duplicates only the first file of the same content is listed"""
+        if not skip_duplicates:
+            return [x.rel_path for x in self.__files]
+        seen = set()
+        result = []
+        for the_entry in self.__files:
+            the_fingerprint = self.fingerprint(the_entry.rel_path)
+            if the_fingerprint is None or the_fingerprint not in seen:
+                seen.add(the_fingerprint)
+                result.append(the_entry.rel_path)
+        return result
+
+    def fingerprint(self, rel_path: str):
+        """content fingerprint of the file, cached while the file size and mtime stay the same"""
+        the_entry = self.__by_rel_path.get(rel_path)
+        if the_entry is None:
+            return jpeg_fingerprint(self.path(rel_path))
+        try:
+            the_stat = os.stat(the_entry.path)
+        except OSError:
+            return None
+        if the_entry.fingerprint is None \
+                or the_entry.size != the_stat.st_size or the_entry.mtime_ns != the_stat.st_mtime_ns:
+            the_entry.size = the_stat.st_size
+            the_entry.mtime_ns = the_stat.st_mtime_ns
+            the_entry.fingerprint = jpeg_fingerprint(the_entry.path)
+        return the_entry.fingerprint
+
+    def duplicates(self) -> dict:
+        """fingerprint -> list of file names which have the same content"""
+        groups = {}
+        for the_entry in self.__files:
+            the_fingerprint = self.fingerprint(the_entry.rel_path)
+            if the_fingerprint is not None:
+                groups.setdefault(the_fingerprint, []).append(the_entry.rel_path)
+        return {k: v for k, v in groups.items() if len(v) > 1}
+
+    def entry(self, rel_path: str):
+        """FileEntry for the file name relative to the working directory or None"""
+        return self.__by_rel_path.get(rel_path)
+
+    def path(self, rel_path: str) -> str:
+        """full path of the file name relative to the working directory"""
+        the_entry = self.__by_rel_path.get(rel_path)
+        if the_entry is None:
+            return os.path.join(self.root, rel_path)
+        return the_entry.path
+
+    def __len__(self):
+        return len(self.__files)
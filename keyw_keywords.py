@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+"""keywords processing for keyw application: normalization and removing duplicates
+
+No wx here, the same code is used by the text fields, the dispatcher and the database.
+Run the module to see how fast it is."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import functools
+
+
+# the words which look like plurals but are not
+NON_PLURALS = frozenset(('news', 'series', 'species', 'always', 'perhaps', 'this', 'its', 'yes', 'his'))
+# the -ies plurals of the words which end with -ie, not -y: movies -> movie
+IE_PLURALS = frozenset(('movies', 'cookies', 'zombies', 'brownies', 'selfies', 'hoodies', 'smoothies', 'calories',
+                        'prairies', 'rookies', 'goalies', 'veggies', 'hippies', 'pixies', 'genies', 'birdies',
+                        'collies', 'budgies', 'freebies', 'newbies', 'sweeties', 'aunties', 'lassies', 'magpies',
+                        'neckties', 'bowties', 'potpies', 'yuppies', 'groupies', 'junkies', 'talkies', 'walkies'))
+
+
+def collapse_spaces(the_line: str) -> str:
+    """remove leading, trailing and repeated spaces"""
+    return ' '.join(the_line.split())
+
+
+def split_keywords(the_line: str) -> list:
+    """list of words in the line, no empty words"""
+    return the_line.split()
+
+
+def singular(word: str) -> str:
+    """naive english singular: boxes -> box, berries -> berry, movies -> movie, cats -> cat"""
+    lower_word = word.lower()
+    if len(word) < 4 or lower_word in NON_PLURALS or lower_word.endswith(('ss', 'us', 'is')):
+        return word
+    if lower_word.endswith('ies'):
+        # ties, pies, lies, dies
+        if len(word) == 4 or lower_word in IE_PLURALS:
+            return word[:-1]
+        return word[:-3] + 'y'
+    if lower_word.endswith(('sses', 'ches', 'shes', 'xes', 'zes')):
+        return word[:-2]
+    if lower_word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+class KeywordNormalizer:
+    """makes the keywords lines tidy and removes duplicates
+
+    Two words are duplicates if they have the same key: the word itself
+    or, optionally, the word folded to lower case, to singular and to its lemma.
+    The first occurrence of the word is kept as it is."""
+    def __init__(self, fold_case: bool = False, fold_plurals: bool = False, lemmatize: bool = False):
+        self.fold_case = fold_case
+        self.fold_plurals = fold_plurals
+        self.__lemmatizer = None
+        if lemmatize:
+            self.__lemmatizer = self.__load_lemmatizer()
+        self.lemmatize = self.__lemmatizer is not None
+        self.__plain = not (fold_case or fold_plurals or self.lemmatize)
+        # the folding is not cheap and the vocabulary is not that big
+        self.key = functools.lru_cache(maxsize=100000)(self.key)
+
+    @staticmethod
+    def __load_lemmatizer():
+        try:
+            from nltk.stem import WordNetLemmatizer
+            lemmatizer = WordNetLemmatizer()
+            lemmatizer.lemmatize('tests')
+            return lemmatizer
+        except (ImportError, LookupError) as error:
+            print("Note: keywords lemma folding needs nltk with wordnet data, it is switched off:")
+            print(f"  {error}")
+            return None
+
+    def key(self, word: str) -> str:
+        """the word as it is compared with other words"""
+        if self.fold_case:
+            word = word.lower()
+        if self.fold_plurals:
+            word = singular(word)
+        if self.__lemmatizer is not None:
+            word = self.__lemmatizer.lemmatize(self.__lemmatizer.lemmatize(word, 'n'), 'v')
+        return word
+
+    def dedup(self, words, seen: set = None) -> list:
+        """words without duplicates and without the words which are in seen (if given)
+
+        seen gets the keys of the returned words"""
+        if seen is None:
+            seen = set()
+        result = []
+        if self.__plain:
+            for word in words:
+                if word not in seen:
+                    seen.add(word)
+                    result.append(word)
+        else:
+            for word in words:
+                the_key = self.key(word)
+                if the_key not in seen:
+                    seen.add(the_key)
+                    result.append(word)
+        return result
+
+    def normalize_line(self, the_line: str) -> str:
+        """keywords line without extra spaces and duplicates"""
+        return ' '.join(self.dedup(split_keywords(the_line)))
+
+    def dedup_fields(self, lines: list) -> list:
+        """keywords lines without duplicates in all the lines together
+
+        The word stays in the first line it appears in and is removed from the following lines."""
+        seen = set()
+        return [' '.join(self.dedup(split_keywords(the_line), seen)) for the_line in lines]
+
+    def merge_lines(self, lines) -> str:
+        """several keywords lines joined into one, without duplicates"""
+        seen = set()
+        result = []
+        for the_line in lines:
+            if the_line is not None:
+                result.extend(self.dedup(split_keywords(the_line), seen))
+        return ' '.join(result)
+
+
+# the normalizer used when the caller doesn't have its own
+__default_normalizer = None
+
+
+def get_default_normalizer() -> KeywordNormalizer:
+    """the normalizer shared by the text fields, the dispatcher and the database"""
+    global __default_normalizer
+    if __default_normalizer is None:
+        __default_normalizer = KeywordNormalizer()
+    return __default_normalizer
+
+
+def set_default_normalizer(normalizer: KeywordNormalizer):
+    """use the normalizer with the options from keyw.ini"""
+    global __default_normalizer
+    __default_normalizer = normalizer
+
+
+def __benchmark():
+    """compare with the nested loops we had in KeywDispatcher"""
+    import random
+    import string
+    import timeit
+
+    def old_rm_duplicates(outp_list):
+        for i in range(len(outp_list)):
+            if i < 10 and len(outp_list[i]) > 0:
+                for keyw in outp_list[i]:
+                    for other_index in range(i + 1, len(outp_list)):
+                        if keyw in outp_list[other_index]:
+                            outp_list[other_index].remove(keyw)
+        return outp_list
+
+    random.seed(1)
+    vocabulary = [''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 10))) for _ in range(300)]
+    for n_words in (5, 20, 50):
+        lines = [' '.join(random.choices(vocabulary, k=n_words)) for _ in range(11)]
+        n = 2000
+        plain = KeywordNormalizer()
+        folding = KeywordNormalizer(fold_case=True, fold_plurals=True)
+        t_old = timeit.timeit(lambda: old_rm_duplicates([x.split(' ') for x in lines]), number=n) / n
+        t_new = timeit.timeit(lambda: plain.dedup_fields(lines), number=n) / n
+        t_fold = timeit.timeit(lambda: folding.dedup_fields(lines), number=n) / n
+        print(f"11 fields x {n_words:3d} words: nested loops {t_old * 1e6:8.1f} us, "
+              f"hash pass {t_new * 1e6:8.1f} us, with case and plural folding {t_fold * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    __benchmark()
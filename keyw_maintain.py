@@ -0,0 +1,290 @@
+"""keyw database maintenance: size, query plans, statistics, free pages and thumbnails
+
+The health report shows for the main DB and every shard the pages of the tables
+and indexes (from the dbstat virtual table if sqlite has it), the share of the
+thumbnails and the free pages, then the plans of the queries keyw makes most and
+how long they take. The maintenance is:
+
+  ANALYZE              the statistics for the query planner
+  incremental vacuum   the free pages are given back to the file system; the DB made
+                       without auto_vacuum gets it with one full VACUUM first
+  thumbnails           optionally the thumbnails are re-encoded with the lower jpeg quality,
+                       the one is kept only if it gets smaller; the atlas tiles of the
+                       changed thumbnails are removed, they are made again when needed
+
+The queries are timed before and after, so it is seen what it gave.
+The report alone doesn't change DB, it is not even checked.
+
+usage: keyw_cli.py maintain [--report] [--thumbnail-quality <quality>]"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import io
+import os
+import sqlite3
+import time
+
+from keyw_atlas import ATLAS_FILE
+from keyw_atlas import ThumbnailAtlas
+from keyw_db import IMG_DATA_COLUMNS
+from keyw_db import KeywDB
+from keyw_db import search_query
+
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_MODES = ('none', 'full', 'incremental')
+# how many times the query is run for the timing, the best time counts
+TIMING_REPEAT = 3
+# the jpeg qualities Pillow makes sense of
+MIN_THUMBNAIL_QUALITY = 1
+MAX_THUMBNAIL_QUALITY = 95
+
+
+def pillow_recompress(jpg_data: bytes, quality: int) -> bytes:
+    """the jpg data encoded again with the quality, made with Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Error: re-compressing the thumbnails needs Pillow, please install it:")
+        print("  pip install Pillow")
+        exit(1)
+    with Image.open(io.BytesIO(jpg_data)) as the_image:
+        the_data = io.BytesIO()
+        the_image.convert('RGB').save(the_data, 'JPEG', quality=quality, optimize=True)
+    return the_data.getvalue()
+
+
+class DBMaintenance:
+    """health report and maintenance of DB and its shards
+
+    check=False is for the report only: the DB check may change the DB schema"""
+    def __init__(self, keyw_db: KeywDB, check: bool = True):
+        self.keyw_db = keyw_db
+        if check and not keyw_db.checked:
+            keyw_db.check_db()
+
+    def __conn(self) -> sqlite3.Connection:
+        conn = self.keyw_db.create_db_conn(self.keyw_db.THE_DB_FILE)
+        if conn is None:
+            print(f"Error: can't create the {self.keyw_db.THE_DB_FILE} database connection!")
+            exit(1)
+        return conn
+
+    def schemas(self) -> list:
+        return ['main'] + [self.keyw_db.shard_schema(shard) for shard in self.keyw_db.shards()]
+
+    def sizes(self) -> dict:
+        """schema -> {'pages', 'page_size', 'free_pages', 'auto_vacuum', 'thumbnail_bytes', 'tables'}
+
+        tables is the list of (name, pages, unused bytes), empty if sqlite is built without dbstat"""
+        result = {}
+        conn = self.__conn()
+        try:
+            for schema in self.schemas():
+                the_size = {name: conn.execute(f"""PRAGMA {schema}.{name}""").fetchone()[0]
+                            for name in ('page_count', 'page_size', 'freelist_count', 'auto_vacuum')}
+                the_size = {'pages': the_size['page_count'],
+                            'page_size': the_size['page_size'],
+                            'free_pages': the_size['freelist_count'],
+                            'auto_vacuum': AUTO_VACUUM_MODES[the_size['auto_vacuum']],
+                            'thumbnail_bytes': conn.execute(f"""SELECT total(length(thumbnail))
+                                                            FROM {schema}.Images""").fetchone()[0],
+                            'tables': []}
+                try:
+                    the_size['tables'] = conn.execute("""SELECT name, count(*), total(unused) FROM dbstat(?)
+                                                      GROUP BY name ORDER BY count(*) DESC""",
+                                                      (schema,)).fetchall()
+                except sqlite3.OperationalError:
+                    pass
+                result[schema] = the_size
+        finally:
+            conn.close()
+        return result
+
+    def queries(self, conn: sqlite3.Connection) -> dict:
+        """name -> (sql, parameters) of the queries keyw makes most, with the values from DB
+
+        The DB not checked yet may be made before the fingerprint and dhash columns,
+        the queries of the missing columns are skipped."""
+        columns = {row[0] for row in conn.execute("""SELECT name FROM pragma_table_info('Images')""")}
+        row = conn.execute("""SELECT file_name FROM Images LIMIT 1""").fetchone()
+        file_name = row[0] if row is not None else ''
+        result = {
+            'search': search_query('white isolated', 'file_name'),
+            'image data': ("""SELECT * FROM Img_data WHERE file_name=?""", (file_name,)),
+        }
+        if 'fingerprint' in columns:
+            row = conn.execute("""SELECT fingerprint FROM Images WHERE file_name=?""", (file_name,)).fetchone()
+            fingerprint = row[0] if row is not None and row[0] is not None else ''
+            result['fingerprint'] = ("""SELECT thumbnail FROM Images WHERE fingerprint=? LIMIT 1""", (fingerprint,))
+        if 'dhash' in columns:
+            result['dhashes'] = ("""SELECT file_name, dhash FROM Images WHERE dhash IS NOT NULL""", ())
+        result['export'] = (f"""SELECT {', '.join(IMG_DATA_COLUMNS)} FROM Img_data ORDER BY file_name""", ())
+        return result
+
+    def query_plans(self) -> dict:
+        """name -> list of the EXPLAIN QUERY PLAN lines"""
+        conn = self.__conn()
+        try:
+            return {name: [row[3] for row in conn.execute("""EXPLAIN QUERY PLAN """ + sql, params)]
+                    for name, (sql, params) in self.queries(conn).items()}
+        finally:
+            conn.close()
+
+    def query_times(self, repeat: int = TIMING_REPEAT) -> dict:
+        """name -> the best time of the query with all the rows fetched, ms"""
+        result = {}
+        conn = self.__conn()
+        try:
+            for name, (sql, params) in self.queries(conn).items():
+                best = None
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    conn.execute(sql, params).fetchall()
+                    t = (time.perf_counter() - t0) * 1000
+                    best = t if best is None else min(best, t)
+                result[name] = best
+        finally:
+            conn.close()
+        return result
+
+    def analyze(self):
+        """gather the statistics the query planner uses"""
+        conn = self.__conn()
+        try:
+            for schema in self.schemas():
+                conn.execute(f"""ANALYZE {schema}""")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def vacuum(self) -> dict:
+        """give the free pages back to the file system, return schema -> pages freed
+
+        The DB without auto_vacuum is switched to the incremental one, it takes the full VACUUM once."""
+        result = {}
+        # every file by its own connection: VACUUM doesn't go with the views over the shards
+        for schema, db_file in zip(self.schemas(), self.keyw_db.db_files()):
+            conn = sqlite3.connect(db_file)
+            try:
+                pages = conn.execute("""PRAGMA page_count""").fetchone()[0]
+                auto_vacuum = conn.execute("""PRAGMA auto_vacuum""").fetchone()[0]
+                if AUTO_VACUUM_MODES[auto_vacuum] != 'incremental':
+                    conn.execute("""PRAGMA auto_vacuum=INCREMENTAL""")
+                    conn.execute("""VACUUM""")
+                else:
+                    conn.execute("""PRAGMA incremental_vacuum""").fetchall()
+                result[schema] = pages - conn.execute("""PRAGMA page_count""").fetchone()[0]
+            except sqlite3.OperationalError as error:
+                print(f"Error: can't vacuum {db_file}, is it used by the other keyw process?")
+                print(f"  {error}")
+            finally:
+                conn.close()
+        return result
+
+    def recompress_thumbnails(self, quality: int, recompress=None, chunk_size: int = 500) -> tuple:
+        """encode the thumbnails again with the jpeg quality, return (file names of the replaced ones, bytes saved)
+
+        recompress(jpg_data, quality) -> jpg data, the default is made with Pillow"""
+        if recompress is None:
+            recompress = pillow_recompress
+        replaced = []
+        n_saved = 0
+        conn = self.__conn()
+        try:
+            for schema in self.schemas():
+                last_name = ''
+                while True:
+                    rows = conn.execute(f"""SELECT file_name, thumbnail FROM {schema}.Images WHERE file_name > ?
+                                        ORDER BY file_name LIMIT ?""", (last_name, chunk_size)).fetchall()
+                    if len(rows) == 0:
+                        break
+                    last_name = rows[-1][0]
+                    updates = []
+                    for file_name, thumbnail in rows:
+                        new_thumbnail = recompress(thumbnail, quality)
+                        if len(new_thumbnail) < len(thumbnail):
+                            updates.append((new_thumbnail, file_name))
+                            n_saved += len(thumbnail) - len(new_thumbnail)
+                    conn.executemany(f"""UPDATE {schema}.Images SET thumbnail=? WHERE file_name=?""", updates)
+                    conn.commit()
+                    replaced.extend(file_name for _, file_name in updates)
+        except sqlite3.Error as error:
+            conn.rollback()
+            print("Error: can't write the thumbnails to DB:")
+            print(f"  {error}")
+        finally:
+            conn.close()
+        return replaced, n_saved
+
+
+def print_sizes(sizes: dict):
+    for schema, the_size in sizes.items():
+        total = the_size['pages'] * the_size['page_size']
+        thumbnails = the_size['thumbnail_bytes']
+        print(f"{schema}: {total / 2**20:.1f} MB, {the_size['pages']} pages of {the_size['page_size']} bytes, "
+              f"{the_size['free_pages']} free, auto_vacuum {the_size['auto_vacuum']}")
+        print(f"  thumbnails: {thumbnails / 2**20:.1f} MB ({thumbnails / max(total, 1):.0%})")
+        for name, pages, unused in the_size['tables']:
+            print(f"  {name}: {pages} pages, {unused / max(pages * the_size['page_size'], 1):.0%} unused")
+
+
+def print_times(times: dict, before: dict = None):
+    for name, t in times.items():
+        was = f" (was {before[name]:.2f} ms)" if before is not None and name in before else ''
+        print(f"  {name}: {t:.2f} ms{was}")
+
+
+def remove_atlas_tiles(keyw_db: KeywDB, file_names: list) -> int:
+    """remove the atlas tiles of the images if there is the atlas, return the number of tiles removed"""
+    atlas_file = os.path.join(keyw_db.db_dir, ATLAS_FILE)
+    if len(file_names) == 0 or not os.path.exists(atlas_file):
+        return 0
+    atlas = ThumbnailAtlas(atlas_file)
+    n_removed = 0
+    for file_name in file_names:
+        if file_name in atlas:
+            atlas.remove(file_name)
+            n_removed += 1
+    return n_removed
+
+
+def maintain(keyw_db: KeywDB, report_only: bool = False, thumbnail_quality: int = None):
+    """print the health report, do the maintenance and show what it gave"""
+    if thumbnail_quality is not None and not MIN_THUMBNAIL_QUALITY <= thumbnail_quality <= MAX_THUMBNAIL_QUALITY:
+        print(f"Error: the thumbnail quality {thumbnail_quality} is not in "
+              f"{MIN_THUMBNAIL_QUALITY}..{MAX_THUMBNAIL_QUALITY}!")
+        exit(1)
+    maintenance = DBMaintenance(keyw_db, check=not report_only)
+    print_sizes(maintenance.sizes())
+    print("query plans:")
+    for name, plan in maintenance.query_plans().items():
+        print(f"  {name}: {'; '.join(plan)}")
+    times = maintenance.query_times()
+    print("query times:")
+    print_times(times)
+    if report_only:
+        return
+
+    t0 = time.perf_counter()
+    maintenance.analyze()
+    print(f"ANALYZE: {(time.perf_counter() - t0) * 1000:.0f} ms")
+    if thumbnail_quality is not None:
+        t0 = time.perf_counter()
+        replaced, n_saved = maintenance.recompress_thumbnails(thumbnail_quality)
+        print(f"thumbnails: {len(replaced)} re-compressed, {n_saved / 2**20:.1f} MB saved, "
+              f"{(time.perf_counter() - t0):.1f} s")
+        n_removed = remove_atlas_tiles(keyw_db, replaced)
+        if n_removed > 0:
+            print(f"atlas: {n_removed} tiles of the old thumbnails removed, keyw_cli.py atlas rebuild makes them again")
+    t0 = time.perf_counter()
+    freed = maintenance.vacuum()
+    print(f"vacuum: {sum(freed.values())} pages freed, {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    print("after the maintenance:")
+    print_sizes(maintenance.sizes())
+    print("query times:")
+    print_times(maintenance.query_times(), times)
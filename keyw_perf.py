@@ -0,0 +1,206 @@
+"""timing of keyw application
+
+startup: the time of every startup phase, printed with keyw_run.py --timing
+latency: per-operation latency histograms, on with LATENCY_STATS = yes in keyw.ini
+
+Run the module to see how much the timers cost."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import contextlib
+import functools
+import json
+import threading
+import time
+
+
+class StartupTimer:
+    """time of the startup phases from the moment the module is imported"""
+    def __init__(self):
+        self.enabled = False
+        self.t0 = time.perf_counter()
+        self.__last = self.t0
+        self.phases = []
+
+    def mark(self, phase: str):
+        """the phase has just finished"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.__last))
+        self.__last = now
+
+    def total(self) -> float:
+        """time since the start, s"""
+        return self.__last - self.t0
+
+    def report(self, target_ms: float = 0):
+        """print the phases and the total time compared with the target"""
+        if not self.enabled:
+            return
+        print("keyw startup:")
+        for phase, dt in self.phases:
+            print(f"  {phase:<32s} {dt * 1000:8.1f} ms")
+        total_ms = self.total() * 1000
+        print(f"  {'total':<32s} {total_ms:8.1f} ms")
+        if target_ms > 0:
+            verdict = "ok" if total_ms <= target_ms else "SLOW"
+            print(f"  {'cold start target':<32s} {target_ms:8.1f} ms  {verdict}")
+
+
+# the timer started when keyw_run.py imports this module
+startup = StartupTimer()
+
+
+class LatencyStats:
+    """latency histograms of the operations
+
+    The bucket i counts the calls which took less than 2**i microseconds
+    (and not less than 2**(i-1)), so the histogram is small and the percentiles
+    are good enough to see where the time goes. When disabled, the timers
+    only check the flag."""
+    N_BUCKETS = 32
+
+    def __init__(self):
+        self.enabled = False
+        self.__lock = threading.Lock()
+        # op -> [count, total time s, max time s, buckets]
+        self.__ops = {}
+
+    def measure(self, op: str):
+        """context manager which adds the time of the block to the op histogram"""
+        if not self.enabled:
+            return _NOT_MEASURED
+        return _OpTimer(self, op)
+
+    def record(self, op: str, dt: float):
+        """add the time dt, s to the op histogram"""
+        the_bucket = min(int(dt * 1e6).bit_length(), self.N_BUCKETS - 1)
+        with self.__lock:
+            the_op = self.__ops.get(op)
+            if the_op is None:
+                the_op = [0, 0., 0., [0] * self.N_BUCKETS]
+                self.__ops[op] = the_op
+            the_op[0] += 1
+            the_op[1] += dt
+            if dt > the_op[2]:
+                the_op[2] = dt
+            the_op[3][the_bucket] += 1
+
+    def reset(self):
+        with self.__lock:
+            self.__ops = {}
+
+    def summary(self) -> dict:
+        """op -> count, mean, p50, p95 and max time in ms and the histogram"""
+        with self.__lock:
+            ops = {op: (n, total, t_max, list(buckets)) for op, (n, total, t_max, buckets) in self.__ops.items()}
+        the_summary = {}
+        for op, (n, total, t_max, buckets) in sorted(ops.items()):
+            the_summary[op] = {
+                'count': n,
+                'total_ms': round(total * 1000, 3),
+                'mean_ms': round(total / n * 1000, 3),
+                'p50_ms': round(min(self.__percentile(buckets, n, 0.5), t_max) * 1000, 3),
+                'p95_ms': round(min(self.__percentile(buckets, n, 0.95), t_max) * 1000, 3),
+                'max_ms': round(t_max * 1000, 3),
+                # upper bucket bound in us -> count
+                'histogram_us': {2 ** i: x for i, x in enumerate(buckets) if x > 0}}
+        return the_summary
+
+    @staticmethod
+    def __percentile(buckets: list, n: int, q: float) -> float:
+        """upper bound of the bucket with the q-th call, s"""
+        the_sum = 0
+        for i, x in enumerate(buckets):
+            the_sum += x
+            if the_sum >= q * n:
+                return 2 ** i / 1e6
+        return 2 ** (len(buckets) - 1) / 1e6
+
+    def status_text(self, max_ops: int = 4) -> str:
+        """the slowest operations by the total time, short enough for the status bar"""
+        the_summary = self.summary()
+        slowest = sorted(the_summary, key=lambda op: the_summary[op]['total_ms'], reverse=True)[:max_ops]
+        return '  '.join(f"{op}: {the_summary[op]['p50_ms']:.1f}/{the_summary[op]['p95_ms']:.1f} ms"
+                         for op in slowest)
+
+    def dump_json(self, f_name: str):
+        """write the summary to the json file"""
+        if not self.enabled or len(self.__ops) == 0:
+            return
+        with open(f_name, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+class _OpTimer:
+    __slots__ = ('stats', 'op', 't0')
+
+    def __init__(self, stats: LatencyStats, op: str):
+        self.stats = stats
+        self.op = op
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats.record(self.op, time.perf_counter() - self.t0)
+        return False
+
+
+_NOT_MEASURED = contextlib.nullcontext()
+
+
+# the process-wide latency histograms
+latency = LatencyStats()
+
+
+def timed(op: str):
+    """decorator: add the time of the function calls to the op histogram"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not latency.enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                latency.record(op, time.perf_counter() - t0)
+        return wrapper
+    return decorator
+
+
+def __benchmark():
+    """the cost of the timers when they are off and on"""
+    @timed('noop')
+    def noop():
+        pass
+
+    def bare():
+        pass
+
+    n = 1000000
+    for enabled in (False, True):
+        latency.enabled = enabled
+        t0 = time.perf_counter()
+        for _ in range(n):
+            bare()
+        t_bare = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(n):
+            noop()
+        t_decorated = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(n):
+            with latency.measure('block'):
+                pass
+        t_block = time.perf_counter() - t0
+        print(f"timers {'on ' if enabled else 'off'}: decorator {(t_decorated - t_bare) / n * 1e9:6.0f} ns, "
+              f"with block {t_block / n * 1e9:6.0f} ns per call")
+    print(latency.status_text())
+
+
+if __name__ == "__main__":
+    __benchmark()
@@ -0,0 +1,107 @@
+"""image previews of several resolutions for keyw application
+
+The image is decoded once, at the smallest level of the pyramid which is not
+smaller than the preview, and with reduced resolution if the decoder can do it:
+the jpeg decoder makes 1/2, 1/4 or 1/8 of the image almost for free.
+The smaller levels, the thumbnail for DB included, are made from the cached
+bigger one, so the preview resize doesn't read the file again."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import collections
+import os
+import threading
+
+from keyw_perf import latency
+
+
+PREVIEW_LEVELS = (256, 1024, 2048)
+
+
+def pillow_decode(f_name: str, max_side: int):
+    """(width, height, rgb data) of the jpg image decoded with reduced resolution
+    not less than max_side, or None if there is no Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(f_name) as the_image:
+        the_image.draft('RGB', (max_side, max_side))
+        the_image = the_image.convert('RGB')
+        return the_image.width, the_image.height, the_image.tobytes()
+
+
+class PreviewPyramid:
+    """the cache of the previews of the last images, by levels
+
+    decode(f_name, max_side) -> image not less than max_side, if the image is that big
+    downscale(image, max_side) -> image which fits into max_side square
+    size_of(image) -> (width, height)
+    The images are of the GUI toolkit, the pyramid doesn't look inside them."""
+    def __init__(self, decode, downscale, size_of, levels: tuple = PREVIEW_LEVELS, n_files: int = 4):
+        self.decode = decode
+        self.downscale = downscale
+        self.size_of = size_of
+        self.levels = tuple(sorted(levels))
+        self.n_files = n_files
+        self.__lock = threading.Lock()
+        # (f_name, mtime_ns) -> {level: image}
+        self.__files = collections.OrderedDict()
+
+    def level_for(self, max_side: int) -> int:
+        """the smallest level which is not smaller than max_side"""
+        for level in self.levels:
+            if level >= max_side:
+                return level
+        return self.levels[-1]
+
+    def get(self, f_name: str, level: int):
+        """the image at the level, from the cache if possible"""
+        try:
+            key = (f_name, os.stat(f_name).st_mtime_ns)
+        except OSError:
+            key = (f_name, 0)
+        with self.__lock:
+            pyramid = self.__files.get(key)
+            if pyramid is None:
+                pyramid = {}
+                self.__files[key] = pyramid
+                while len(self.__files) > self.n_files:
+                    self.__files.popitem(last=False)
+            else:
+                self.__files.move_to_end(key)
+            the_image = pyramid.get(level)
+            if the_image is not None:
+                return the_image
+            # the smallest cached level above that one
+            bigger = [x for x in pyramid if x > level]
+            source = pyramid[min(bigger)] if len(bigger) > 0 else None
+        if source is None:
+            # only the level is kept, not the decoded image which may be much bigger
+            with latency.measure('image decode'):
+                source = self.decode(f_name, level)
+        w, h = self.size_of(source)
+        if max(w, h) <= level:
+            the_image = source
+        else:
+            with latency.measure('image scale'):
+                the_image = self.downscale(source, level)
+        with self.__lock:
+            pyramid[level] = the_image
+        return the_image
+
+    def fit(self, f_name: str, width: int, height: int):
+        """the image which fits into width x height, made from the level not smaller than that"""
+        the_image = self.get(f_name, self.level_for(max(width, height)))
+        w, h = self.size_of(the_image)
+        if w <= width and h <= height:
+            return the_image
+        with latency.measure('image scale'):
+            return self.downscale(the_image, min(width * max(w, h) // w, height * max(w, h) // h))
+
+    def clear(self):
+        with self.__lock:
+            self.__files.clear()
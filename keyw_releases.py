@@ -0,0 +1,69 @@
+"""model and property releases index for keyw application"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import os
+
+
+RELEASE_EXTENSIONS = ('.jpg', '.pdf')
+
+
+class ReleaseIndex:
+    """index of the release documents by the day of the shoot
+
+    The release files are named like 2022-11-11_John_Doe.pdf
+    and kept in the Models and Properties subdirectories of the release directory.
+    Each subdirectory is read once and read again only when its mtime changes."""
+    MODELS_DIR = 'Models'
+    PROPERTIES_DIR = 'Properties'
+
+    def __init__(self, release_dir: str):
+        self.release_dir = os.path.expanduser(release_dir)
+        # subdirectory -> (mtime, {day: [names]})
+        self.__cache = {}
+
+    def models(self, the_day: str) -> list:
+        """list of the models who have the release for the_day"""
+        return list(self.__get_index(self.MODELS_DIR).get(the_day, ()))
+
+    def properties(self, the_day: str) -> list:
+        """list of the property owners who have the release for the_day"""
+        return list(self.__get_index(self.PROPERTIES_DIR).get(the_day, ()))
+
+    def invalidate(self):
+        """forget everything, the directories will be read again on the next lookup"""
+        self.__cache = {}
+
+    def __get_index(self, sub_dir: str) -> dict:
+        """day -> names index of the subdirectory, re-read if the subdirectory has been changed"""
+        the_dir = os.path.join(self.release_dir, sub_dir)
+        try:
+            dir_mtime = os.stat(the_dir).st_mtime_ns
+        except OSError:
+            return {}
+        cached = self.__cache.get(sub_dir)
+        if cached is None or cached[0] != dir_mtime:
+            cached = (dir_mtime, self.__read_dir(the_dir))
+            self.__cache[sub_dir] = cached
+        return cached[1]
+
+    @staticmethod
+    def __read_dir(the_dir: str) -> dict:
+        """read the release files of the directory into day -> names index"""
+        index = {}
+        try:
+            with os.scandir(the_dir) as it:
+                for dir_entry in it:
+                    stem, ext = os.path.splitext(dir_entry.name)
+                    if ext.lower() not in RELEASE_EXTENSIONS:
+                        continue
+                    the_day, _, the_name = stem.partition('_')
+                    if len(the_name) > 0:
+                        index.setdefault(the_day, set()).add(the_name.replace('_', ' '))
+        except OSError as error:
+            print(f"Error: can't read the directory {the_dir}:")
+            print(f"  {error}")
+        return {k: sorted(v) for k, v in index.items()}
@@ -1,17 +1,27 @@
 #!/usr/bin/python3
 
-__version__ = '01.01.2023'
+__version__ = '19.10.2026'
 __author__ = 'Serhiy Kobyakov'
 __license__ = "MIT"
 
 
+import sys
+
+from keyw_perf import startup
+
 import wx
+startup.mark('import wx')
 from keyw import KeywFrame
+startup.mark('import keyw')
 
 
 if __name__ == "__main__":
+    # keyw_run.py --timing: print the startup phases time
+    startup.enabled = '--timing' in sys.argv[1:]
     app = wx.App()
+    startup.mark('wx.App')
     frame = KeywFrame(None)
     frame.Center()
     frame.Show()
+    startup.mark('frame shown')
     app.MainLoop()
@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+"""local read-only HTTP/JSON service over the keyw database
+
+The upload scripts and dashboards ask the service instead of opening
+my_metadata.sqlite3, so they don't lock DB while the images are being tagged:
+
+  GET /search?q=white+isolated[&limit=100]   json array of {"file_name", "thumbnail"}
+  GET /image/<file name>                      json object with the image data
+  GET /thumbnail/<file name>                  the thumbnail jpeg
+
+DB is switched to the WAL journal mode, and the queries are made with a pool
+of read-only connections in the worker threads. Every response has an ETag
+made from the request and the DB files state, so the client with If-None-Match
+gets 304 without a query while nothing has been written to DB.
+
+The service settings are in keyw.ini:
+SERVER_HOST = 127.0.0.1
+SERVER_PORT = 8765
+SERVER_POOL_SIZE = 4
+
+usage: keyw_server.py [--port <port>]"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import argparse
+import asyncio
+import concurrent.futures
+import configparser
+import hashlib
+import json
+import os
+import urllib.parse
+
+from keyw_db import IMG_DATA_COLUMNS
+from keyw_db import SEARCH_LIMIT
+from keyw_db import KeywDB
+from keyw_db import search_query
+from keyw_keywords import collapse_spaces
+
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+# the search results are sent by chunks of that many images
+CHUNK_SIZE = 200
+MAX_SEARCH_LIMIT = 10000
+
+
+class ReadPool:
+    """read-only DB connections shared by the requests
+
+    The connection is taken for the whole request and is used
+    by one worker thread at a time."""
+    def __init__(self, keyw_db: KeywDB, size: int = 4):
+        self.keyw_db = keyw_db
+        self.size = size
+        self.__executor = concurrent.futures.ThreadPoolExecutor(size, thread_name_prefix='keyw_server')
+        self.__free = None
+
+    def open(self):
+        """open the connections, they are kept open so the write-ahead log stays in place"""
+        self.__free = asyncio.Queue()
+        for _ in range(self.size):
+            conn = self.keyw_db.read_only_conn()
+            # the log is opened with the first read
+            conn.execute("""SELECT count(*) FROM sqlite_master""").fetchone()
+            self.__free.put_nowait(conn)
+
+    async def acquire(self):
+        return await self.__free.get()
+
+    def release(self, conn):
+        self.__free.put_nowait(conn)
+
+    async def run(self, fn, *args):
+        """run fn(*args) in the worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, fn, *args)
+
+    def close(self):
+        self.__executor.shutdown(wait=True)
+        while self.__free is not None and not self.__free.empty():
+            self.__free.get_nowait().close()
+
+
+class KeywServer:
+    """HTTP/1.1 server on asyncio streams, GET only"""
+    def __init__(self, keyw_db: KeywDB, host: str = '127.0.0.1', port: int = 8765, pool_size: int = 4):
+        self.keyw_db = keyw_db
+        self.host = host
+        self.port = port
+        self.pool = ReadPool(keyw_db, pool_size)
+        self.server = None
+        if not keyw_db.enable_wal():
+            print("Note: DB is not in the WAL journal mode, the readers may wait for the writer")
+
+    def db_version(self) -> str:
+        """changes with every write to DB: the state of DB files and their write-ahead logs"""
+        version = []
+        for db_file in self.keyw_db.db_files():
+            for f_name in (db_file, db_file + '-wal'):
+                try:
+                    st = os.stat(f_name)
+                    version.append(f"{st.st_mtime_ns}:{st.st_size}")
+                except OSError:
+                    version.append('-')
+        return '/'.join(version)
+
+    def etag(self, target: str) -> str:
+        the_hash = hashlib.blake2b(f"{self.db_version()} {target}".encode(), digest_size=12)
+        return f'"{the_hash.hexdigest()}"'
+
+    async def start(self):
+        self.pool.open()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        # the port may be 0: the system chooses a free one
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        print(f"keyw server: http://{self.host}:{self.port}/")
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.pool.close()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                request_line = await reader.readline()
+                if len(request_line) == 0:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.send(writer, 400, b'', close=True)
+                    break
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.handle_request(writer, method, target, headers, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, writer, method: str, target: str, headers: dict, keep_alive: bool):
+        if method != 'GET':
+            await self.send(writer, 405, self.error_json("only GET is supported"), close=not keep_alive)
+            return
+        the_etag = self.etag(target)
+        if headers.get('if-none-match') == the_etag:
+            await self.send(writer, 304, b'', etag=the_etag, close=not keep_alive)
+            return
+        url = urllib.parse.urlsplit(target)
+        path = urllib.parse.unquote(url.path)
+        conn = await self.pool.acquire()
+        try:
+            if path == '/search':
+                await self.do_search(writer, conn, urllib.parse.parse_qs(url.query), the_etag, keep_alive)
+            elif path.startswith('/image/'):
+                await self.do_image(writer, conn, path[len('/image/'):], the_etag, keep_alive)
+            elif path.startswith('/thumbnail/'):
+                await self.do_thumbnail(writer, conn, path[len('/thumbnail/'):], the_etag, keep_alive)
+            else:
+                await self.send(writer, 404, self.error_json(f"unknown path {path}"), close=not keep_alive)
+        except ConnectionError:
+            raise
+        except Exception as e:
+            print(f"Error: keyw server request {target}:")
+            print(f"  {e}")
+            await self.send(writer, 500, self.error_json(str(e)), close=True)
+        finally:
+            self.pool.release(conn)
+
+    async def do_search(self, writer, conn, query: dict, the_etag: str, keep_alive: bool):
+        search_str = collapse_spaces(' '.join(query.get('q', [])))
+        if len(search_str) == 0:
+            await self.send(writer, 400, self.error_json("the search words are missing: /search?q=..."),
+                            close=not keep_alive)
+            return
+        try:
+            # limit 0 or below would be no limit for sqlite
+            limit = max(1, min(int(query.get('limit', [SEARCH_LIMIT])[0]), MAX_SEARCH_LIMIT))
+        except ValueError:
+            await self.send(writer, 400, self.error_json("limit must be a number"), close=not keep_alive)
+            return
+        cursor = await self.pool.run(conn.execute, *search_query(search_str, 'file_name', limit))
+        await self.send_headers(writer, 200, 'application/json', etag=the_etag, chunked=True, close=not keep_alive)
+        try:
+            n_rows = 0
+            while True:
+                rows = await self.pool.run(cursor.fetchmany, CHUNK_SIZE)
+                if len(rows) == 0:
+                    break
+                the_chunk = ''.join(('[' if n_rows + i == 0 else ',') + '\n' +
+                                    json.dumps({'file_name': row[0],
+                                                'thumbnail': '/thumbnail/' + urllib.parse.quote(row[0])},
+                                               ensure_ascii=False)
+                                    for i, row in enumerate(rows))
+                n_rows += len(rows)
+                await self.send_chunk(writer, the_chunk.encode())
+            await self.send_chunk(writer, b'\n]\n' if n_rows > 0 else b'[]\n')
+            await self.send_chunk(writer, b'')
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # the status is sent already: the connection is dropped without the last chunk,
+            # so the client sees the response is not complete
+            print(f"Error: keyw server search {search_str}:")
+            print(f"  {e}")
+            writer.transport.abort()
+            raise ConnectionAbortedError(str(e)) from e
+
+    async def do_image(self, writer, conn, file_name: str, the_etag: str, keep_alive: bool):
+        cursor = await self.pool.run(conn.execute, """SELECT * FROM Img_data WHERE file_name=?""", (file_name,))
+        row = await self.pool.run(cursor.fetchone)
+        if row is None:
+            await self.send(writer, 404, self.error_json(f"no data for {file_name}"), close=not keep_alive)
+            return
+        the_data = json.dumps(dict(zip(IMG_DATA_COLUMNS, row)), ensure_ascii=False).encode()
+        await self.send(writer, 200, the_data, etag=the_etag, close=not keep_alive)
+
+    async def do_thumbnail(self, writer, conn, file_name: str, the_etag: str, keep_alive: bool):
+        cursor = await self.pool.run(conn.execute, """SELECT thumbnail FROM Images WHERE file_name=?""",
+                                     (file_name,))
+        row = await self.pool.run(cursor.fetchone)
+        if row is None or row[0] is None:
+            await self.send(writer, 404, self.error_json(f"no thumbnail for {file_name}"), close=not keep_alive)
+            return
+        await self.send(writer, 200, bytes(row[0]), 'image/jpeg', etag=the_etag, close=not keep_alive)
+
+    @staticmethod
+    def error_json(message: str) -> bytes:
+        return json.dumps({'error': message}).encode()
+
+    async def send_headers(self, writer, status: int, content_type: str, length: int = None, etag: str = None,
+                           chunked: bool = False, close: bool = False):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}"]
+        if status != 304:
+            lines.append(f"Content-Type: {content_type}")
+        if etag is not None:
+            lines.append(f"ETag: {etag}")
+            lines.append("Cache-Control: no-cache")
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+        elif length is not None:
+            lines.append(f"Content-Length: {length}")
+        lines.append("Connection: close" if close else "Connection: keep-alive")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def send_chunk(self, writer, the_data: bytes):
+        writer.write(f"{len(the_data):x}\r\n".encode() + the_data + b'\r\n')
+        await writer.drain()
+
+    async def send(self, writer, status: int, the_data: bytes, content_type: str = 'application/json',
+                   etag: str = None, close: bool = False):
+        await self.send_headers(writer, status, content_type, len(the_data), etag, close=close)
+        writer.write(the_data)
+        await writer.drain()
+
+
+def serve(keyw_db: KeywDB, config: configparser.ConfigParser, port: int = None):
+    """run the service until Ctrl+C"""
+    server = KeywServer(keyw_db,
+                        host=config.get('keyw', 'SERVER_HOST', fallback='127.0.0.1'),
+                        port=port if port is not None else config.getint('keyw', 'SERVER_PORT', fallback=8765),
+                        pool_size=config.getint('keyw', 'SERVER_POOL_SIZE', fallback=4))
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("keyw server: stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="local read-only HTTP/JSON service over keyw database")
+    parser.add_argument('--port', type=int, help="port to listen on instead of SERVER_PORT from keyw.ini")
+    args = parser.parse_args()
+
+    from keyw_cli import main
+    main(['serve'] + (['--port', str(args.port)] if args.port is not None else []))
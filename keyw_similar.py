@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+"""visually similar images search over the thumbnails in keyw database
+
+Every thumbnail gets a 64 bit difference hash (dHash): the image is reduced
+to 9x8 gray pixels, and the bit is set when the pixel is brighter than its right
+neighbour. Similar images have the hashes which differ in few bits, so the
+nearest images are the ones with the smallest Hamming distance.
+
+The hashes are kept in the Images dhash column and are made for the new
+thumbnails on the next search. The distances to all the images are found in one
+pass over the array of hashes: with NumPy if it is installed, else with int.bit_count.
+
+Run the module to see how fast it is."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import heapq
+import io
+import threading
+
+from keyw_db import KeywDB
+from keyw_perf import timed
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+# the images which differ in more bits are not similar
+MAX_DISTANCE = 16
+
+
+def dhash(pixels: bytes) -> int:
+    """difference hash of the 9x8 gray image, the pixels go by rows"""
+    the_hash = 0
+    for y in range(HASH_HEIGHT):
+        row = pixels[y * HASH_WIDTH:(y + 1) * HASH_WIDTH]
+        for x in range(HASH_WIDTH - 1):
+            the_hash = (the_hash << 1) | (row[x] > row[x + 1])
+    return the_hash
+
+
+def pillow_gray(jpg_data: bytes) -> bytes:
+    """9x8 gray pixels of the jpg image, made with Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Error: the similar images search without GUI needs Pillow, please install it:")
+        print("  pip install Pillow")
+        exit(1)
+    with Image.open(io.BytesIO(jpg_data)) as the_image:
+        # let the jpeg decoder do the most of downscaling
+        the_image.draft('L', (HASH_WIDTH * 4, HASH_HEIGHT * 4))
+        return the_image.convert('L').resize((HASH_WIDTH, HASH_HEIGHT), Image.BILINEAR).tobytes()
+
+
+def to_db_int(the_hash: int) -> int:
+    """sqlite integers are signed 64 bit"""
+    return the_hash - (1 << 64) if the_hash >= (1 << 63) else the_hash
+
+
+def from_db_int(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class SimilarityIndex:
+    """the perceptual hashes of all the thumbnails in DB
+
+    gray(jpg_data) -> 9x8 gray pixels is used to hash the thumbnails,
+    the GUI uses its own one, the default is made with Pillow."""
+    def __init__(self, keyw_db: KeywDB, gray=None):
+        self.keyw_db = keyw_db
+        self.gray = gray if gray is not None else pillow_gray
+        self.__lock = threading.Lock()
+        self.__names = []
+        self.__hashes = []
+        self.__stale = True
+
+    def __len__(self):
+        return len(self.__names)
+
+    def on_image_saved(self, old_data, new_data):
+        """KeywDB insert hook: the saved image gets the hash on the next search"""
+        self.__stale = True
+
+    def refresh(self, chunk_size: int = 1000) -> int:
+        """hash the thumbnails which don't have the hash yet and reload the hashes, return the number of new ones"""
+        n_hashed = 0
+        with self.__lock:
+            if not self.__stale:
+                return 0
+            while True:
+                rows = self.keyw_db.get_thumbnails_without_dhash(chunk_size)
+                if len(rows) == 0:
+                    break
+                n_updated = self.keyw_db.set_dhashes([(to_db_int(dhash(self.gray(thumbnail))), file_name)
+                                                      for file_name, thumbnail in rows])
+                if n_updated == 0:
+                    # the same rows would come again
+                    print(f"Error: keyw similar: can't write the hashes of {len(rows)} thumbnails to DB, "
+                          "they are left without the hash")
+                    break
+                n_hashed += len(rows)
+                if n_hashed >= 10000 and n_hashed % 10000 < chunk_size:
+                    print(f"keyw similar: {n_hashed} thumbnails hashed")
+            rows = self.keyw_db.get_dhashes()
+            self.__names = [file_name for file_name, _ in rows]
+            hashes = [from_db_int(value) for _, value in rows]
+            self.__hashes = numpy.array(hashes, dtype=numpy.uint64) if numpy is not None else hashes
+            self.__stale = False
+        return n_hashed
+
+    @timed('similar search')
+    def nearest(self, the_hash: int, k: int = 20, max_distance: int = MAX_DISTANCE) -> list:
+        """list of (distance, file_name) of the k most similar images"""
+        self.refresh()
+        with self.__lock:
+            names, hashes = self.__names, self.__hashes
+        if len(names) == 0:
+            return []
+        if numpy is not None:
+            distances = self.__distances_numpy(hashes, the_hash)
+            candidates = numpy.flatnonzero(distances <= max_distance)
+            if len(candidates) > k:
+                candidates = candidates[numpy.argpartition(distances[candidates], k - 1)[:k]]
+            found = [(int(distances[i]), names[i]) for i in candidates]
+        else:
+            found = heapq.nsmallest(k, ((distance, i) for i, distance in
+                                        enumerate((x ^ the_hash).bit_count() for x in hashes)
+                                        if distance <= max_distance))
+            found = [(distance, names[i]) for distance, i in found]
+        return sorted(found)
+
+    @staticmethod
+    def __distances_numpy(hashes, the_hash: int):
+        xor = numpy.bitwise_xor(hashes, numpy.uint64(the_hash))
+        if hasattr(numpy, 'bitwise_count'):
+            return numpy.bitwise_count(xor)
+        return POPCOUNT8[xor.view(numpy.uint8)].reshape(-1, 8).sum(axis=1)
+
+    def similar_to(self, jpg_data: bytes, k: int = 20, max_distance: int = MAX_DISTANCE) -> list:
+        """list of (distance, file_name) of the images which look like the jpg image"""
+        return self.nearest(dhash(self.gray(jpg_data)), k, max_distance)
+
+
+if numpy is not None:
+    POPCOUNT8 = numpy.array([bin(i).count('1') for i in range(256)], dtype=numpy.uint8)
+
+
+def __benchmark():
+    """100k random hashes, time for the 20 nearest"""
+    import random
+    import time
+
+    class FakeDB:
+        def get_thumbnails_without_dhash(self, limit):
+            return []
+
+        def get_dhashes(self):
+            return [(f"{i:06d}.jpg", to_db_int(random.getrandbits(64))) for i in range(100000)]
+
+    random.seed(1)
+    index = SimilarityIndex(FakeDB())
+    t0 = time.perf_counter()
+    index.refresh()
+    print(f"{len(index)} hashes loaded in {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"({'numpy' if numpy is not None else 'pure python'})")
+    n = 20
+    t0 = time.perf_counter()
+    for _ in range(n):
+        found = index.nearest(random.getrandbits(64), max_distance=24)
+    print(f"20 nearest: {(time.perf_counter() - t0) / n * 1000:.1f} ms per search, the best: {found[:3]}")
+
+
+if __name__ == "__main__":
+    __benchmark()
@@ -0,0 +1,114 @@
+"""spellcheck service for keyw application
+
+One dictionary per process shared by all the text fields,
+with memoized results and the user words which are always correct."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import concurrent.futures
+import functools
+import os
+import threading
+
+
+class SpellChecker:
+    """enchant dictionary with memoized check() and the user words"""
+    def __init__(self, language: str = "en_US", cache_size: int = 50000):
+        self.language = language
+        self.cache_size = cache_size
+        self.pwl_file = ''
+        self.__dict = None
+        self.__dict_lock = threading.Lock()
+        self.__user_words = frozenset()
+        self.__check = functools.lru_cache(maxsize=cache_size)(self.__check_in_dict)
+        # enchant dictionaries are not thread safe,
+        # so the suggestions are made by the separate dictionary in the worker thread
+        self.__suggest_dict = None
+        self.__suggest = functools.lru_cache(maxsize=1000)(self.__suggest_in_dict)
+        self.__executor = None
+
+    def set_personal_word_list(self, pwl_file: str):
+        """use the personal word list file (one word per line) along with the dictionary"""
+        pwl_file = os.path.expanduser(pwl_file)
+        if pwl_file != self.pwl_file:
+            self.pwl_file = pwl_file
+            self.__dict = None
+            self.__check.cache_clear()
+            self.__suggest_dict = None
+            self.__suggest.cache_clear()
+
+    def add_user_words(self, words):
+        """treat the words as correct ones, e.g. the keywords we already have in DB"""
+        self.__user_words = self.__user_words.union(words)
+
+    def check(self, word: str) -> bool:
+        """True if the word is spelled correctly"""
+        if len(word) == 0 or word in self.__user_words:
+            return True
+        return self.__check(word)
+
+    def suggest(self, word: str) -> list:
+        """list of suggestions for the misspelled word, the keywords we already have go first
+
+        it takes a while, so call it from the worker thread only, see suggest_async()"""
+        suggestions = self.__suggest(word)
+        user_words = self.__user_words
+        return [x for x in suggestions if x in user_words] + [x for x in suggestions if x not in user_words]
+
+    def suggest_async(self, word: str, callback) -> concurrent.futures.Future:
+        """make suggestions in the worker thread and call callback(suggestions) from there"""
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                    thread_name_prefix='keyw_spell')
+
+        def do_suggest():
+            callback(self.suggest(word))
+
+        return self.__executor.submit(do_suggest)
+
+    def cache_info(self):
+        """memo cache statistics"""
+        return self.__check.cache_info()
+
+    def preload_in_background(self):
+        """load the dictionary in the worker thread, so the first check doesn't wait for it"""
+        threading.Thread(target=self.__get_dict, name='keyw_spell_load', daemon=True).start()
+
+    def __get_dict(self):
+        with self.__dict_lock:
+            if self.__dict is None:
+                self.__dict = self.__load_dict()
+            return self.__dict
+
+    def __check_in_dict(self, word: str) -> bool:
+        return self.__get_dict().check(word)
+
+    def __suggest_in_dict(self, word: str) -> tuple:
+        if self.__suggest_dict is None:
+            self.__suggest_dict = self.__load_dict()
+        return tuple(self.__suggest_dict.suggest(word))
+
+    def __load_dict(self):
+        # enchant takes a while to import, so it is done when the dictionary is needed
+        import enchant
+        if len(self.pwl_file) > 0:
+            if not os.path.exists(self.pwl_file):
+                with open(self.pwl_file, "w"):
+                    pass
+            return enchant.DictWithPWL(self.language, self.pwl_file)
+        return enchant.Dict(self.language)
+
+
+# the process-wide spellchecker
+__the_spellchecker = None
+
+
+def get_spellchecker() -> SpellChecker:
+    """the spellchecker shared by all the text fields"""
+    global __the_spellchecker
+    if __the_spellchecker is None:
+        __the_spellchecker = SpellChecker()
+    return __the_spellchecker
@@ -0,0 +1,183 @@
+"""keywords vocabulary of the keyw database
+
+All the keywords used in DB with their usage counts and the fields they are used in.
+It is loaded once in the background and then kept current by the KeywDB insert hook,
+so the spellcheck, the autocomplete and the statistics don't scan Images on their own."""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import array
+import sys
+import threading
+
+from keyw_db import IMG_DATA_COLUMNS
+from keyw_db import KEYWORD_COLUMNS
+from keyw_db import KeywDB
+
+
+class Vocabulary:
+    """keywords vocabulary stored compactly
+
+    Word id is the index in the list of interned words,
+    the counts and the field bitmasks are arrays indexed by the word id.
+    The field bit is set when the word is used in the field
+    and stays set when the image is replaced."""
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__words = []
+        self.__ids = {}
+        self.__counts = array.array('I')
+        self.__fields = array.array('H')
+        self.loaded = False
+        self.__loading = False
+        # the images saved while the vocabulary is being loaded
+        self.__pending = []
+        # callbacks listener(removed_words, added_words)
+        self.__listeners = []
+
+    def __len__(self):
+        return len(self.__words)
+
+    def count(self, word: str) -> int:
+        """how many times the word is used in DB"""
+        word_id = self.__ids.get(word)
+        return 0 if word_id is None else self.__counts[word_id]
+
+    def fields(self, word: str) -> list:
+        """the keywords fields the word is used in"""
+        word_id = self.__ids.get(word)
+        if word_id is None:
+            return []
+        mask = self.__fields[word_id]
+        return [field for i, field in enumerate(KEYWORD_COLUMNS) if mask & (1 << i)]
+
+    def counts(self, min_count: int = 1) -> dict:
+        """word -> count for the words used at least min_count times"""
+        with self.__lock:
+            return {word: n for word, n in zip(self.__words, self.__counts) if n >= min_count}
+
+    def words(self, min_count: int = 1) -> list:
+        """the words used at least min_count times"""
+        with self.__lock:
+            return [word for word, n in zip(self.__words, self.__counts) if n >= min_count]
+
+    def add_listener(self, listener):
+        """call listener(removed_words, added_words) when the image is saved"""
+        self.__listeners.append(listener)
+
+    def load(self, keyw_db: KeywDB, chunk_size: int = 5000):
+        """read all the keywords from DB
+
+        DB is read by the short queries, so the images may be saved meanwhile even without
+        the write-ahead log. The image saved before its chunk was read is counted by the scan,
+        its saves waiting in the pending queue till then are dropped."""
+        with self.__lock:
+            self.__loading = True
+        words = []
+        ids = {}
+        counts = array.array('I')
+        fields = array.array('H')
+        # file name -> the number of its pending saves the scan has seen
+        seen = {}
+
+        def on_read(rows):
+            with self.__lock:
+                pending_names = {new_data[0] for _, new_data in self.__pending}
+                for row in rows:
+                    if row[0] in pending_names:
+                        seen[row[0]] = len(self.__pending)
+
+        columns = ('file_name',) + KEYWORD_COLUMNS
+        last_name = ''
+        while True:
+            rows = keyw_db.get_images_data_chunk(last_name, columns, chunk_size, on_read)
+            if len(rows) == 0:
+                break
+            last_name = rows[-1][0]
+            for img_data in rows:
+                for i, the_line in enumerate(img_data[1:]):
+                    if the_line is None or len(the_line) == 0:
+                        continue
+                    bit = 1 << i
+                    for word in the_line.split():
+                        word_id = ids.get(word)
+                        if word_id is None:
+                            word_id = len(words)
+                            word = sys.intern(word)
+                            ids[word] = word_id
+                            words.append(word)
+                            counts.append(1)
+                            fields.append(bit)
+                        else:
+                            counts[word_id] += 1
+                            fields[word_id] |= bit
+        with self.__lock:
+            self.__words, self.__ids, self.__counts, self.__fields = words, ids, counts, fields
+            self.__loading = False
+            self.loaded = True
+            pending, self.__pending = self.__pending, []
+        for i, (old_data, new_data) in enumerate(pending):
+            if i >= seen.get(new_data[0], 0):
+                self.on_image_saved(old_data, new_data)
+
+    def load_in_background(self, keyw_db: KeywDB, on_loaded=None) -> threading.Thread:
+        """load the vocabulary in the worker thread and call on_loaded() from there when done"""
+        def do_load():
+            self.load(keyw_db)
+            if on_loaded is not None:
+                on_loaded()
+
+        the_thread = threading.Thread(target=do_load, name='keyw_vocab', daemon=True)
+        the_thread.start()
+        return the_thread
+
+    def on_image_saved(self, old_data, new_data):
+        """KeywDB insert hook: old_data and new_data are the Img_data rows, old_data may be None"""
+        with self.__lock:
+            if self.__loading:
+                self.__pending.append((old_data, new_data))
+                return
+            removed = self.__update(old_data, -1)
+            added = self.__update(new_data, 1)
+        for listener in self.__listeners:
+            listener(removed, added)
+
+    def __update(self, img_data, delta: int) -> list:
+        """add or remove the keywords of the image, return the list of the words"""
+        the_words = []
+        if img_data is None:
+            return the_words
+        first = len(IMG_DATA_COLUMNS) - len(KEYWORD_COLUMNS)
+        for i, the_line in enumerate(img_data[first:]):
+            if the_line is None or len(the_line) == 0:
+                continue
+            for word in the_line.split():
+                the_words.append(word)
+                word_id = self.__ids.get(word)
+                if word_id is None:
+                    if delta < 0:
+                        continue
+                    word_id = len(self.__words)
+                    word = sys.intern(word)
+                    self.__ids[word] = word_id
+                    self.__words.append(word)
+                    self.__counts.append(0)
+                    self.__fields.append(0)
+                if delta > 0:
+                    self.__counts[word_id] += 1
+                    self.__fields[word_id] |= 1 << i
+                elif self.__counts[word_id] > 0:
+                    self.__counts[word_id] -= 1
+        return the_words
+
+    def memory_footprint(self) -> int:
+        """approximate memory used by the vocabulary, bytes"""
+        with self.__lock:
+            the_size = sys.getsizeof(self.__words) + sys.getsizeof(self.__ids)
+            the_size += sum(sys.getsizeof(word) for word in self.__words)
+            the_size += self.__counts.buffer_info()[1] * self.__counts.itemsize
+            the_size += self.__fields.buffer_info()[1] * self.__fields.itemsize
+        return the_size
@@ -0,0 +1,64 @@
+"""tests of the jpeg files index and its fingerprints cache
+
+run: python -m pytest  or  python -m unittest"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import keyw_files
+from keyw_files import FileIndex
+
+
+def write_jpeg(f_name: str, scan_data: bytes, metadata: bytes = b''):
+    """the smallest file which looks like jpeg: SOI, APP1 with the metadata, SOS with the scan data, EOI"""
+    app1 = b'\xff\xe1' + (len(metadata) + 2).to_bytes(2, 'big') + metadata
+    sos = b'\xff\xda\x00\x02'
+    with open(f_name, 'wb') as f:
+        f.write(b'\xff\xd8' + app1 + sos + scan_data + b'\xff\xd9')
+
+
+class TestFileIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+        write_jpeg(os.path.join(self.root, 'img_1.jpg'), b'one')
+        write_jpeg(os.path.join(self.root, 'img_2.jpg'), b'two')
+        write_jpeg(os.path.join(self.root, 'img_10.jpg'), b'one', b'other metadata')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_names(self):
+        files = FileIndex(self.root)
+        self.assertEqual(files.names(), ['img_1.jpg', 'img_2.jpg', 'img_10.jpg'])
+        # img_10.jpg has the same scan data as img_1.jpg
+        self.assertEqual(files.names(skip_duplicates=True), ['img_1.jpg', 'img_2.jpg'])
+
+    def test_only_changed_files_are_hashed_again(self):
+        files = FileIndex(self.root)
+        with mock.patch.object(keyw_files, 'jpeg_fingerprint', wraps=keyw_files.jpeg_fingerprint) as hashed:
+            files.names(skip_duplicates=True)
+            self.assertEqual(hashed.call_count, 3)
+            files.names(skip_duplicates=True)
+            self.assertEqual(hashed.call_count, 3)
+
+            # the directory is read again: the new file and the changed one are hashed
+            write_jpeg(os.path.join(self.root, 'img_3.jpg'), b'three')
+            write_jpeg(os.path.join(self.root, 'img_2.jpg'), b'two changed')
+            os.utime(os.path.join(self.root, 'img_2.jpg'), ns=(1, 1))
+            os.utime(self.root, ns=(2, 2))
+            self.assertTrue(files.refresh())
+            self.assertEqual(files.names(skip_duplicates=True), ['img_1.jpg', 'img_2.jpg', 'img_3.jpg'])
+            self.assertEqual(sorted(os.path.basename(call.args[0]) for call in hashed.call_args_list[3:]),
+                             ['img_2.jpg', 'img_3.jpg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""tests of the keywords normalization and removing duplicates
+
+run: python -m pytest  or  python -m unittest"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import unittest
+
+from keyw_keywords import KeywordNormalizer
+from keyw_keywords import singular
+
+
+class TestSingular(unittest.TestCase):
+    def test_regular_plurals(self):
+        for plural, word in (('cats', 'cat'), ('boxes', 'box'), ('berries', 'berry'), ('churches', 'church'),
+                             ('bushes', 'bush'), ('glasses', 'glass'), ('cities', 'city')):
+            self.assertEqual(singular(plural), word)
+
+    def test_ie_plurals(self):
+        for plural, word in (('movies', 'movie'), ('ties', 'tie'), ('pies', 'pie'), ('cookies', 'cookie'),
+                             ('lies', 'lie'), ('zombies', 'zombie'), ('selfies', 'selfie')):
+            self.assertEqual(singular(plural), word)
+
+    def test_not_plurals(self):
+        for word in ('news', 'series', 'species', 'glass', 'cactus', 'basis', 'bus', 'yes', 'is', 'tree'):
+            self.assertEqual(singular(word), word)
+
+    def test_case_is_kept(self):
+        self.assertEqual(singular('Movies'), 'Movie')
+
+
+class TestKeywordNormalizer(unittest.TestCase):
+    def test_normalize_line(self):
+        normalizer = KeywordNormalizer()
+        self.assertEqual(normalizer.normalize_line('  cat  dog cat   bird '), 'cat dog bird')
+        self.assertEqual(normalizer.normalize_line(''), '')
+        # without folding the case and the plurals matter
+        self.assertEqual(normalizer.normalize_line('Cat cat cats'), 'Cat cat cats')
+
+    def test_dedup(self):
+        normalizer = KeywordNormalizer()
+        seen = {'dog'}
+        self.assertEqual(normalizer.dedup(['cat', 'dog', 'cat', 'bird'], seen), ['cat', 'bird'])
+        self.assertEqual(seen, {'dog', 'cat', 'bird'})
+        self.assertEqual(normalizer.dedup([]), [])
+
+    def test_dedup_fields(self):
+        normalizer = KeywordNormalizer()
+        lines = ['cat dog', 'dog bird', '', 'cat fish  bird']
+        # the word stays in the first line
+        self.assertEqual(normalizer.dedup_fields(lines), ['cat dog', 'bird', '', 'fish'])
+
+    def test_merge_lines(self):
+        normalizer = KeywordNormalizer()
+        self.assertEqual(normalizer.merge_lines(['cat dog', None, 'dog bird', '']), 'cat dog bird')
+        self.assertEqual(normalizer.merge_lines([]), '')
+
+    def test_fold_case(self):
+        normalizer = KeywordNormalizer(fold_case=True)
+        self.assertEqual(normalizer.normalize_line('Cat cat CAT dog'), 'Cat dog')
+        self.assertEqual(normalizer.dedup_fields(['Sky', 'sky blue']), ['Sky', 'blue'])
+        # plurals are not folded
+        self.assertEqual(normalizer.normalize_line('cat Cats'), 'cat Cats')
+
+    def test_fold_plurals(self):
+        normalizer = KeywordNormalizer(fold_plurals=True)
+        self.assertEqual(normalizer.normalize_line('movie movies tie ties berry berries'), 'movie tie berry')
+        self.assertEqual(normalizer.merge_lines(['cookies', 'cookie box boxes']), 'cookies box')
+        # the case is not folded
+        self.assertEqual(normalizer.normalize_line('Cat cats'), 'Cat cats')
+
+    def test_fold_case_and_plurals(self):
+        normalizer = KeywordNormalizer(fold_case=True, fold_plurals=True)
+        self.assertEqual(normalizer.normalize_line('Movies movie Cats cat news'), 'Movies Cats news')
+
+
+if __name__ == "__main__":
+    unittest.main()
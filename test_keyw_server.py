@@ -0,0 +1,138 @@
+"""tests of the keyw HTTP/JSON service on localhost with a temporary DB
+
+run: python -m pytest  or  python -m unittest"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import asyncio
+import http.client
+import json
+import socket
+import tempfile
+import threading
+import unittest
+import urllib.parse
+
+from keyw_db import KeywDB
+from keyw_server import KeywServer
+
+
+N_IMAGES = 5
+
+
+def image_args(file_name: str, title: str) -> tuple:
+    """the insert_image_data() arguments: thumbnail, file_name, isolation, ..., the_rest"""
+    return (b'\xff\xd8' + file_name.encode(), file_name, 'isolated', '', '', title) + ('',) * 12
+
+
+class TestKeywServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.keyw_db = KeywDB(cls.tmp_dir.name)
+        cls.keyw_db.insert_images_data([(image_args(f"img_{i}.jpg", f"white cat {i}"), f"fp{i}")
+                                        for i in range(N_IMAGES)])
+        cls.server = KeywServer(cls.keyw_db, port=0, pool_size=2)
+        cls.loop = asyncio.new_event_loop()
+        cls.loop.run_until_complete(cls.server.start())
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        asyncio.run_coroutine_threadsafe(cls.stop_server(), cls.loop).result(10)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.server.pool.close()
+        cls.loop.close()
+        cls.tmp_dir.cleanup()
+
+    @classmethod
+    async def stop_server(cls):
+        """close the server and the client connections while the loop is running"""
+        cls.server.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get(self, target: str, headers: dict = None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=10)
+        try:
+            conn.request('GET', target, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.getheader('ETag'), response.read()
+        finally:
+            conn.close()
+
+    def test_search(self):
+        status, _, the_data = self.get('/search?q=white+cat')
+        self.assertEqual(status, 200)
+        results = json.loads(the_data)
+        self.assertEqual(sorted(x['file_name'] for x in results), [f"img_{i}.jpg" for i in range(N_IMAGES)])
+        self.assertEqual(results[0]['thumbnail'], '/thumbnail/' + urllib.parse.quote(results[0]['file_name']))
+        status, _, the_data = self.get('/search?q=dog')
+        self.assertEqual((status, json.loads(the_data)), (200, []))
+        status, _, _ = self.get('/search')
+        self.assertEqual(status, 400)
+
+    def test_search_limit(self):
+        status, _, the_data = self.get('/search?q=white&limit=2')
+        self.assertEqual((status, len(json.loads(the_data))), (200, 2))
+        # no limit would be returned for 0 or below, it is clamped to 1
+        for limit in ('0', '-1'):
+            status, _, the_data = self.get(f'/search?q=white&limit={limit}')
+            self.assertEqual((status, len(json.loads(the_data))), (200, 1))
+        status, _, _ = self.get('/search?q=white&limit=many')
+        self.assertEqual(status, 400)
+
+    def test_image(self):
+        status, _, the_data = self.get('/image/img_1.jpg')
+        self.assertEqual(status, 200)
+        the_data = json.loads(the_data)
+        self.assertEqual((the_data['file_name'], the_data['title']), ('img_1.jpg', 'white cat 1'))
+        status, _, _ = self.get('/image/missing.jpg')
+        self.assertEqual(status, 404)
+        status, _, the_data = self.get('/thumbnail/img_2.jpg')
+        self.assertEqual((status, the_data), (200, b'\xff\xd8img_2.jpg'))
+
+    def test_etag(self):
+        status, etag, _ = self.get('/image/img_3.jpg')
+        self.assertEqual(status, 200)
+        self.assertIsNotNone(etag)
+        status, _, the_data = self.get('/image/img_3.jpg', {'If-None-Match': etag})
+        self.assertEqual((status, the_data), (304, b''))
+        status, _, _ = self.get('/image/img_4.jpg', {'If-None-Match': etag})
+        self.assertEqual(status, 200)
+
+    def test_search_error_after_headers(self):
+        run = self.server.pool.run
+
+        async def failing_run(fn, *args):
+            if getattr(fn, '__name__', '') == 'fetchmany':
+                raise RuntimeError("the read failed")
+            return await run(fn, *args)
+
+        self.server.pool.run = failing_run
+        try:
+            with socket.create_connection(('127.0.0.1', self.server.port), timeout=10) as sock:
+                sock.sendall(b'GET /search?q=white HTTP/1.1\r\nHost: localhost\r\n\r\n')
+                the_data = b''
+                while True:
+                    part = sock.recv(65536)
+                    if len(part) == 0:
+                        break
+                    the_data += part
+        finally:
+            self.server.pool.run = run
+        # one status line and no last chunk: the client sees the response is cut
+        self.assertTrue(the_data.startswith(b'HTTP/1.1 200 OK'))
+        self.assertEqual(the_data.count(b'HTTP/1.1'), 1)
+        self.assertFalse(the_data.endswith(b'0\r\n\r\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""tests of the perceptual hashes of the thumbnails kept in DB and its shards
+
+run: python -m pytest  or  python -m unittest"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import tempfile
+import unittest
+
+from keyw_db import KeywDB
+from keyw_similar import SimilarityIndex
+from keyw_similar import dhash
+
+
+def image_args(file_name: str) -> tuple:
+    """the insert_image_data() arguments: thumbnail, file_name, isolation, ..., the_rest"""
+    return (b'\xff\xd8' + file_name.encode(), file_name) + ('',) * 16
+
+
+def gray(jpg_data: bytes) -> bytes:
+    """9x8 gray pixels made from the data, the same data gives the same pixels"""
+    return bytes((b * 37 + i) % 256 for i, b in enumerate((jpg_data * 72)[:72]))
+
+
+class TestDhashes(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # the image saved before DB_SHARDS = year is set stays in main, its year gets the shard later
+        KeywDB(self.tmp_dir.name).insert_image_data(*image_args('2022-01-01_00-00-00_0000.jpg'))
+        self.keyw_db = KeywDB(self.tmp_dir.name, sharding=True)
+        self.keyw_db.insert_images_data([(image_args('2022-02-02_00-00-00_0000.jpg'), None),
+                                         (image_args('2023-03-03_00-00-00_0000.jpg'), None),
+                                         (image_args('IMG_0001.jpg'), None)])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_image_in_main_with_shard_of_its_year(self):
+        self.assertEqual(self.keyw_db.shards(), ('2022', '2023'))
+        self.assertEqual(SimilarityIndex(self.keyw_db, gray).refresh(), 4)
+        hashes = dict(self.keyw_db.get_dhashes())
+        self.assertEqual(len(hashes), 4)
+        self.assertEqual(self.keyw_db.get_thumbnails_without_dhash(), [])
+        the_index = SimilarityIndex(self.keyw_db, gray)
+        self.assertEqual(the_index.refresh(), 0)
+        self.assertEqual(len(the_index), 4)
+        the_hash = dhash(gray(image_args('2022-01-01_00-00-00_0000.jpg')[0]))
+        self.assertEqual(the_index.nearest(the_hash, k=1)[0], (0, '2022-01-01_00-00-00_0000.jpg'))
+
+    def test_refresh_stops_without_progress(self):
+        self.keyw_db.set_dhashes = lambda dhashes: 0
+        self.assertEqual(SimilarityIndex(self.keyw_db, gray).refresh(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
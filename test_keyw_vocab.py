@@ -0,0 +1,82 @@
+"""tests of the keywords vocabulary loading while the images are saved
+
+run: python -m pytest  or  python -m unittest"""
+
+__version__ = '19.10.2026'
+__author__ = 'Serhiy Kobyakov'
+__license__ = "MIT"
+
+
+import tempfile
+import threading
+import unittest
+
+from keyw_db import KeywDB
+from keyw_vocab import Vocabulary
+
+
+N_IMAGES = 4
+
+
+def image_args(file_name: str, concept: str) -> tuple:
+    """the insert_image_data() arguments: thumbnail, file_name, isolation, ..., the_rest"""
+    return (b'', file_name, '', '', '', '', '', concept) + ('',) * 10
+
+
+class TestVocabularyLoad(unittest.TestCase):
+    def setUp(self):
+        # the DB is not switched to the write-ahead log, as the GUI doesn't do it
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.keyw_db = KeywDB(self.tmp_dir.name)
+        self.keyw_db.insert_images_data([(image_args(f"img_{i}.jpg", "cat"), f"fp{i}") for i in range(N_IMAGES)])
+        self.vocabulary = Vocabulary()
+        self.keyw_db.insert_hooks.append(self.vocabulary.on_image_saved)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def load_with_save(self, file_name: str, n_chunk: int) -> list:
+        """load the vocabulary by one image chunks while the image is saved with the new keywords
+
+        The save is made in the other thread before the n_chunk chunk is read,
+        return the numbers of the images written by the save."""
+        get_images_data_chunk = self.keyw_db.get_images_data_chunk
+        n_written = []
+        n_read = 0
+
+        def save():
+            n_written.append(self.keyw_db.insert_images_data([(image_args(file_name, 'dog'), None)]))
+
+        def get_chunk_with_save(*args, **kwargs):
+            nonlocal n_read
+            if n_read == n_chunk:
+                the_thread = threading.Thread(target=save)
+                the_thread.start()
+                the_thread.join()
+            n_read += 1
+            return get_images_data_chunk(*args, **kwargs)
+
+        self.keyw_db.get_images_data_chunk = get_chunk_with_save
+        self.vocabulary.load(self.keyw_db, chunk_size=1)
+        return n_written
+
+    def test_save_of_scanned_image(self):
+        self.assertEqual(self.load_with_save('img_0.jpg', 2), [1])
+        self.assertEqual((self.vocabulary.count('cat'), self.vocabulary.count('dog')), (N_IMAGES - 1, 1))
+
+    def test_save_of_image_not_scanned_yet(self):
+        self.assertEqual(self.load_with_save('img_3.jpg', 1), [1])
+        self.assertEqual((self.vocabulary.count('cat'), self.vocabulary.count('dog')), (N_IMAGES - 1, 1))
+
+    def test_save_of_new_image(self):
+        self.assertEqual(self.load_with_save('img_9.jpg', 1), [1])
+        self.assertEqual((self.vocabulary.count('cat'), self.vocabulary.count('dog')), (N_IMAGES, 1))
+
+    def test_save_after_load(self):
+        self.vocabulary.load(self.keyw_db)
+        self.keyw_db.insert_image_data(*image_args('img_1.jpg', 'dog cat'), fingerprint='fp1')
+        self.assertEqual((self.vocabulary.count('cat'), self.vocabulary.count('dog')), (N_IMAGES, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()